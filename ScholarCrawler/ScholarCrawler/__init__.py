@@ -14,5 +14,8 @@ app.config.from_object('ScholarCrawler.settings.LocalConfig')
 from . import api
 from . import views
 
+# Create the repository indexes
+api.create_indexes()
+
 # Start the Scheduler
 scheduler = api.create_scheduler()
\ No newline at end of file
@@ -2,7 +2,9 @@
 Routes and views for the flask application API.
 """
 
-from flask import request, jsonify, session
+import datetime
+
+from flask import Response, request, jsonify, session, stream_with_context
 from functools import wraps
 
 from . import app
@@ -21,6 +23,11 @@ def create_scheduler():
     return create_scheduler_process(app.config['REPOSITORY_NAME'], app.config['REPOSITORY_SETTINGS'])
 
 
+# Create the repository indexes (called on startup)
+def create_indexes():
+    connect_db().ensure_indexes()
+
+
 # Connect to the local scheduler
 def connect_scheduler():
     from . import scheduler
@@ -69,9 +76,13 @@ def api_function(called_function=None):
     if called_function == 'logout':
         message = api_logout()
     elif called_function == 'extract_articles':
-        message = api_extract_articles()
+        message = api_extract_articles(request)
     elif called_function == 'get_articles':
-        message = api_get_articles()
+        message = api_get_articles(request)
+    elif called_function == 'get_changes':
+        message = api_get_article_changes(request)
+    elif called_function == 'get_crawler_status':
+        message = api_get_crawler_status()
     elif called_function == 'get_settings':
         message = api_get_user_settings()
     elif called_function == 'get_job_status':
@@ -91,6 +102,54 @@ def api_function(called_function=None):
                     "message": message})
 
 
+# Export the User articles (streamed while they are read from the repository)
+@app.route('/api/export/<export_format>', methods=['GET'])
+@login_required_api
+def api_export(export_format=None):
+    from .articleExport import create_export, export_formats
+
+    message = api_check_export(request, export_format)
+    if message is not None:
+        return jsonify({"name": app.config['API_NAME'], "version": app.config['API_VERSION'],
+                        "function": 'export', "message": message})
+
+    location = request.values.get('location', 'all')
+    since = request.values.get('since')
+    # The update dates are stored in UTC: a date with offset is converted, a date without it is read as UTC
+    if since:
+        since = datetime.datetime.fromisoformat(since)
+        if since.tzinfo is not None:
+            since = since.astimezone(datetime.timezone.utc)
+        since = since.strftime('%Y-%m-%d %H:%M:%S')
+
+    articles = connect_db().iter_articles(session['user']['id'], location, since or None,
+                                          app.config['ARTICLES_EXPORT_BATCH_SIZE'])
+
+    filename = 'articles-' + session['user']['id'] + '.' + export_formats[export_format][2]
+    return Response(stream_with_context(create_export(export_format, articles or [])),
+                    mimetype=export_formats[export_format][1],
+                    headers={'Content-Disposition': 'attachment; filename=' + filename})
+
+
+# Check the arguments of an export request (returns the error message or None)
+def api_check_export(export_request, export_format):
+    from .articleExport import export_formats
+
+    if export_format not in export_formats:
+        return 'Unknown export format: ' + str(export_format)
+
+    if export_request.values.get('location', 'all') not in ('user', 'others', 'all'):
+        return 'Unknown location: ' + export_request.values.get('location')
+
+    if export_request.values.get('since'):
+        try:
+            datetime.datetime.fromisoformat(export_request.values.get('since'))
+        except ValueError:
+            return 'Invalid since date: ' + export_request.values.get('since')
+
+    return None
+
+
 # Make the login request
 def api_login(login_request):
     # Check the request method and the database for data
@@ -194,11 +253,28 @@ def api_signup(signup_request):
 
 # Returns the API server status
 def api_info():
+    # Same module path used by the crawlers (see crawlerGeneral.create_crawler)
+    from crawler.httpProviders.proxyTorManager import get_tor_manager
+    from crawler.httpProviders.providerRegistry import get_provider_registry
+    from crawler.versionResolver import version_resolver
+
     return {
         'database': connect_db().name,
         'communication_protocol': 'HTTP',  # Later we can add Websockets or another protocol
         'scheduler_store': connect_scheduler().name,
         'scheduler_status': connect_scheduler().get_status(),
+        'extractor_versions': version_resolver.get_stats(),
+        'tor_circuits': get_tor_manager().get_status(),
+        'http_endpoints': get_provider_registry().get_status(),
+    }
+
+
+# Returns the crawler status that is only shown to the logged users (the paused hosts and exit points)
+def api_get_crawler_status():
+    from crawler.circuitBreaker import get_circuit_breaker
+
+    return {
+        'open_circuits': get_circuit_breaker().get_status(),
     }
 
 
@@ -211,25 +287,84 @@ def api_logout():
     return 'Logout successful'
 
 
+# Get the crawler options of the job from the request (the missing ones use the default crawler settings)
+def get_crawler_options(job_request):
+    options = {}
+
+    if job_request.values.get('engine') in ('thread', 'async'):
+        options['engine'] = job_request.values.get('engine')
+
+    for option in ('incremental', 'pipeline'):
+        if job_request.values.get(option) is not None:
+            options[option] = job_request.values.get(option).lower() in ('1', 'true')
+
+    return options
+
+
 # Makes the Google Scholar Articles extraction
-def api_extract_articles():
+def api_extract_articles(extract_request):
     from .crawler.crawlerGeneral import create_crawler_and_extract
 
     # Start a 1 time Scheduler job to extract the data
     return connect_scheduler().add_one_time_job(function_name=create_crawler_and_extract,
                                                 func_args={'user_data': session['user'],
-                                                           'desired_crawler': 'googleScholarArticles'},
+                                                           'desired_crawler': 'googleScholarArticles',
+                                                           'options': get_crawler_options(extract_request)},
                                                 user_id=session['user']['id'])
 
 
-# Get the User articles from the database
-def api_get_articles():
-    user_articles = connect_db().get_articles(session['user']['id'])
+# Get a page of the User articles from the database. Arguments: location ('user', 'others' or 'all'), sort
+# ('date' or 'quotes'), limit, cursor (from the previous page) and fields (comma separated)
+def api_get_articles(articles_request):
+    location = articles_request.values.get('location', 'all')
+    sort = articles_request.values.get('sort', 'date')
+    cursor = articles_request.values.get('cursor') or None
+    fields = articles_request.values.get('fields')
+
+    if location not in ('user', 'others', 'all'):
+        return {'error': 'Unknown location: ' + location}
+
+    try:
+        limit = int(articles_request.values.get('limit', app.config['ARTICLES_PAGE_SIZE']))
+    except ValueError:
+        return {'error': 'Invalid limit'}
+
+    limit = max(1, min(limit, app.config['ARTICLES_MAX_PAGE_SIZE']))
+
+    try:
+        page = connect_db().get_articles(session['user']['id'], location, sort, limit, cursor,
+                                         fields.split(',') if fields else None)
+    except ValueError as err:
+        return {'error': str(err)}
+
+    page.update({'location': location, 'sort': sort, 'limit': limit})
+    return page
+
 
-    if len(user_articles['user']) + len(user_articles['others']) > 0:
-        return user_articles
+# Get the User articles created or updated after the cursor (the articles feed). Arguments: cursor (from the
+# previous call, all the articles without it), limit and location ('user', 'others' or 'all'). The returned
+# cursor is used in the next call, even when there aren't changes
+def api_get_article_changes(changes_request):
+    location = changes_request.values.get('location', 'all')
+    cursor = changes_request.values.get('cursor') or None
 
-    return "No articles found"
+    if location not in ('user', 'others', 'all'):
+        return {'error': 'Unknown location: ' + location}
+
+    try:
+        limit = int(changes_request.values.get('limit', app.config['ARTICLES_MAX_PAGE_SIZE']))
+    except ValueError:
+        return {'error': 'Invalid limit'}
+
+    limit = max(1, min(limit, app.config['ARTICLES_MAX_PAGE_SIZE']))
+
+    try:
+        changes = connect_db().get_article_changes(session['user']['id'], cursor, limit, location,
+                                                   app.config['ARTICLES_CHANGES_LAG'])
+    except ValueError as err:
+        return {'error': str(err)}
+
+    return changes
 
 
 # Get the User settings from the database
@@ -318,29 +453,25 @@ def api_store_user_aliases(update_request):
     if update_request.method != 'POST':
         return 'Bad request type: ' + update_request.method
 
-    # Get the current User Data from the DB
-    user_data = connect_db().get_user_by_id(session['user']['id'])
-
     request_aliases = update_request.form.to_dict()
-    user_data['scholarAliases'] = []
-    user_data['unusedScholarAliases'] = []
+    aliases = []
+    unused_aliases = []
 
     regex = re.compile('unusedAliases', re.IGNORECASE)
     for alias in request_aliases:
         if regex.match(alias):
-            user_data['unusedScholarAliases'].append(request_aliases[alias])
+            unused_aliases.append(request_aliases[alias])
         else:
-            user_data['scholarAliases'].append(request_aliases[alias])
+            aliases.append(request_aliases[alias])
 
-    if not user_data['scholarAliases'] and not user_data['unusedScholarAliases']:
+    if not aliases and not unused_aliases:
         return 'Nothing changed'
 
-    # Upload the changes into the Repository
-    connect_db().update_user_by_id(session['user']['id'], user_data)
+    # Upload the changes into the Repository (the articles of the user are classified again with the new aliases)
+    connect_db().update_user_aliases(session['user']['id'], aliases, unused_aliases)
 
     # Store the new user settings for the current session
-    session['user'] = {'id': str(user_data['_id']), 'name': user_data['name'], 'user': user_data['mail'],
-                       'scholarUser': user_data['scholarUser'], 'scholarAliases': user_data['scholarAliases']}
+    session['user'] = dict(session['user'], scholarAliases=aliases)
 
     return 'Updated the Scholar Aliases'
 
@@ -357,9 +488,14 @@ def api_set_scheduler_job(job_request):
         'second': 0,
     }
 
+    # The scheduled extractions are incremental by default (they stop at the already known articles)
+    options = get_crawler_options(job_request)
+    options.setdefault('incremental', True)
+
     job_id = connect_scheduler().add_scheduled_job(function_name=create_crawler_and_extract,
                                                    func_args={'user_data': session['user'],
-                                                              'desired_crawler': 'googleScholarArticles'},
+                                                              'desired_crawler': 'googleScholarArticles',
+                                                              'options': options},
                                                    user_id=session['user']['id'],
                                                    cron=cron,
                                                    )
@@ -367,22 +503,13 @@ def api_set_scheduler_job(job_request):
     return api_store_user_job_id(job_id)
 
 
-# Store the Job Id in the user settings page TODO move to factory
+# Store the Job Id in the user settings page
 def api_store_user_job_id(job_id):
     if not isinstance(job_id, str) or job_id is '':
         return 'Invalid Job Id'
 
-    # Get the current User Data from the DB
-    user_data = connect_db().get_user_by_id(session['user']['id'])
-
-    user_data['schedulerJobIds'].append(job_id)
-
-    # Upload the changes into the Repository
-    connect_db().update_user_by_id(session['user']['id'], user_data)
-
-    # Store the new user settings for the current session
-    session['user'] = {'id': str(user_data['_id']), 'name': user_data['name'], 'user': user_data['mail'],
-                       'scholarUser': user_data['scholarUser'], 'scholarAliases': user_data['scholarAliases']}
+    # Update the Job Ids of the user in the Repository (the user data of the session doesn't change)
+    connect_db().add_new_scheduler_job_id(session['user']['id'], job_id)
 
     return job_id
 
@@ -407,22 +534,13 @@ def api_remove_scheduler(remove_request):
     return message['message']
 
 
-# Remove the Job Id in the user settings page TODO move to factory
+# Remove the Job Id in the user settings page
 def api_remove_user_job_id(job_id):
     if not isinstance(job_id, str) or job_id is '':
         return 'Invalid Job Id'
 
-    # Get the current User Data from the DB
-    user_data = connect_db().get_user_by_id(session['user']['id'])
-
-    user_data['schedulerJobIds'].remove(job_id)
-
-    # Upload the changes into the Repository
-    connect_db().update_user_by_id(session['user']['id'], user_data)
-
-    # Store the new user settings for the current session
-    session['user'] = {'id': str(user_data['_id']), 'name': user_data['name'], 'user': user_data['mail'],
-                       'scholarUser': user_data['scholarUser'], 'scholarAliases': user_data['scholarAliases']}
+    # Update the Job Ids of the user in the Repository (the user data of the session doesn't change)
+    connect_db().remove_scheduler_job_id(session['user']['id'], job_id)
 
     return job_id
 
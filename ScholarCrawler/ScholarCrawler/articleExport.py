@@ -0,0 +1,90 @@
+"""
+Export of the stored articles as NDJSON, CSV or BibTeX. The exports are generators of text chunks, so the
+articles are written while they are read from the repository cursor.
+"""
+
+import csv
+import io
+import json
+import re
+
+# Columns of the CSV export (the authors are joined with '; ')
+CSV_FIELDS = ['articleId', 'title', 'authors', 'date', 'quotes', 'versions', 'source', 'related', 'description',
+              'location', 'creation_date', 'update_date']
+
+# Characters of the article ids that can't be in a BibTeX key
+regexBibtexKey = re.compile(r'[^A-Za-z0-9_:-]')
+
+
+# Join the lines of an export into chunks of about chunk_size characters (less and bigger chunk writes)
+def join_chunks(lines, chunk_size=65536):
+    chunk = []
+    size = 0
+
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+
+        if size >= chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+
+    if chunk:
+        yield ''.join(chunk)
+
+
+def export_ndjson(articles):
+    for article in articles:
+        yield json.dumps(article, ensure_ascii=False) + '\n'
+
+
+def export_csv(articles):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, CSV_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+
+    for article in articles:
+        if isinstance(article.get('authors'), list):
+            article = dict(article, authors='; '.join(article['authors']))
+
+        writer.writerow(article)
+        yield buffer.getvalue()
+
+        buffer.seek(0)
+        buffer.truncate()
+
+
+# Escape the BibTeX special characters of a field value
+def escape_bibtex(value):
+    return str(value).replace('\\', '\\\\').replace('{', '\\{').replace('}', '\\}')
+
+
+def export_bibtex(articles):
+    for article in articles:
+        fields = [('title', article.get('title'))]
+
+        if article.get('authors'):
+            fields.append(('author', ' and '.join(article['authors'])))
+
+        fields += [('year', article.get('date')), ('url', article.get('source')),
+                   ('abstract', article.get('description'))]
+
+        if article.get('quotes'):
+            fields.append(('note', 'Cited by ' + str(article['quotes'])))
+
+        entry = ',\n'.join('  %s = {%s}' % (name, escape_bibtex(value)) for name, value in fields if value is not None)
+        yield '@article{%s,\n%s\n}\n\n' % (regexBibtexKey.sub('_', str(article.get('articleId'))), entry)
+
+
+# Formats of the exports: generator, mimetype and file extension
+export_formats = {
+    'ndjson': (export_ndjson, 'application/x-ndjson', 'ndjson'),
+    'csv': (export_csv, 'text/csv', 'csv'),
+    'bibtex': (export_bibtex, 'application/x-bibtex', 'bib'),
+}
+
+
+# Create the chunks of the export of the articles in the desired format
+def create_export(export_format, articles, chunk_size=65536):
+    return join_chunks(export_formats[export_format][0](articles), chunk_size)
@@ -0,0 +1,121 @@
+"""
+Circuit breaker that pauses the requests to a host (per proxy identity) after repeated captchas/blocks
+"""
+
+import threading
+import time
+
+breaker_lock = threading.Lock()
+circuit_breaker = None
+
+
+# Get the circuit breaker of the process (created from the CIRCUIT_BREAKER_SETTINGS on the first call)
+def get_circuit_breaker():
+    global circuit_breaker
+    from ScholarCrawler import app
+
+    with breaker_lock:
+        if circuit_breaker is None:
+            circuit_breaker = CircuitBreaker(app.config['CIRCUIT_BREAKER_SETTINGS'])
+
+    return circuit_breaker
+
+
+class CircuitBreaker(object):
+    def __init__(self, settings):
+        self.failureThreshold = settings['failure_threshold']
+        self.cooldown = settings['cooldown']
+        self.maxCooldown = settings['max_cooldown']
+        self.probeWait = settings['probe_wait']
+        self.maxWait = settings['max_wait']
+        self.lock = threading.Lock()
+        self.circuits = {}
+
+    def get_circuit(self, key):
+        if key not in self.circuits:
+            self.circuits[key] = {
+                'state': 'closed',
+                'failures': 0,
+                'trips': 0,
+                'open_until': 0.0,
+                'probing': False,
+            }
+
+        return self.circuits[key]
+
+    # Return the seconds to wait before making a request with the key (0 when the request can be made)
+    def get_delay(self, key):
+        now = time.time()
+
+        with self.lock:
+            circuit = self.get_circuit(key)
+
+            if circuit['state'] == 'closed':
+                return 0
+
+            if circuit['state'] == 'open' and now < circuit['open_until']:
+                return circuit['open_until'] - now
+
+            # After the cooldown only one request (the recovery probe) is allowed until it finishes
+            if circuit['probing']:
+                return self.probeWait
+
+            circuit['state'] = 'half_open'
+            circuit['probing'] = True
+            return 0
+
+    # Close the circuit after a successful request
+    def set_success(self, key):
+        with self.lock:
+            circuit = self.get_circuit(key)
+            circuit['state'] = 'closed'
+            circuit['failures'] = 0
+            circuit['trips'] = 0
+            circuit['probing'] = False
+
+    # Count a blocked request (captcha) and open the circuit when the threshold is reached or the probe failed. The
+    # blocks of the requests sent before the circuit opened (still in flight) don't trip the open circuit again
+    def set_failure(self, key):
+        with self.lock:
+            circuit = self.get_circuit(key)
+            if circuit['state'] == 'open':
+                return
+
+            circuit['failures'] += 1
+
+            if circuit['state'] == 'half_open' or circuit['failures'] >= self.failureThreshold:
+                self.open_circuit(key, circuit)
+
+    # A request failed without a block (server or connection error): it only counts when it was the recovery
+    # probe, which opens the circuit again (otherwise the next requests would wait for the probe forever)
+    def set_error(self, key):
+        with self.lock:
+            circuit = self.get_circuit(key)
+
+            if circuit['state'] == 'half_open':
+                self.open_circuit(key, circuit)
+
+    # Open the circuit (call it with the lock), every consecutive trip doubles the cooldown of the circuit
+    def open_circuit(self, key, circuit):
+        circuit['trips'] += 1
+        cooldown = min(self.maxCooldown, self.cooldown * 2 ** (circuit['trips'] - 1))
+
+        circuit['state'] = 'open'
+        circuit['failures'] = 0
+        circuit['probing'] = False
+        circuit['open_until'] = time.time() + cooldown
+
+        print('Circuit open for ' + key + ' during ' + str(cooldown) + ' seconds')
+
+    # Return the state of the circuits that aren't closed
+    def get_status(self):
+        now = time.time()
+
+        with self.lock:
+            return {
+                key: {
+                    'state': circuit['state'],
+                    'trips': circuit['trips'],
+                    'remaining': max(0, int(circuit['open_until'] - now)),
+                } for key, circuit in self.circuits.items() if circuit['state'] != 'closed'
+            }
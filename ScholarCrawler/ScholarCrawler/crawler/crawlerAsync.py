@@ -0,0 +1,124 @@
+"""
+Asyncio engine to run many crawler extractions concurrently in one event loop
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+engine_lock = threading.Lock()
+async_engine = None
+
+
+# Get the async engine of the process (created and started on the first call)
+def get_async_engine():
+    global async_engine
+    from ScholarCrawler import app
+
+    with engine_lock:
+        if async_engine is None:
+            settings = app.config['CRAWLER_SETTINGS']
+            async_engine = AsyncCrawlerEngine(settings['async_max_connections'], settings['async_max_crawls'],
+                                              settings['async_blocking_workers'])
+
+    return async_engine
+
+
+class AsyncCrawlerEngine(object):
+    def __init__(self, max_connections=100, max_crawls=500, blocking_workers=10):
+        self.maxConnections = max_connections
+        self.maxCrawls = max_crawls
+        self.connector = None
+        self.semaphore = None
+        self.running = {}
+        self.lock = threading.Lock()
+
+        # Executor for the blocking parts of the crawl (repository writes, proxy rotation,...)
+        self.executor = ThreadPoolExecutor(blocking_workers)
+
+        # Run the event loop in its own thread
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.run_loop, name='async-crawler-engine', daemon=True)
+        self.thread.start()
+
+    def run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    # Add the crawler extraction to the event loop and return without waiting for it (a rejected crawler is
+    # closed here, the accepted ones are closed when their crawl ends)
+    def submit(self, crawler):
+        key = crawler.crawler_id + '-' + crawler.userArr['id']
+
+        with self.lock:
+            future = None
+            if key not in self.running:
+                future = asyncio.run_coroutine_threadsafe(self.run_crawler(crawler), self.loop)
+                self.running[key] = future
+
+        if future is None:
+            crawler.close()
+            return 'Process already running in the async engine'
+
+        future.add_done_callback(lambda done: self.remove_crawler(key))
+
+        return 'Process started in the async engine'
+
+    def remove_crawler(self, key):
+        with self.lock:
+            self.running.pop(key, None)
+
+    # Return the number of crawls in the engine (running or waiting for a free slot)
+    def get_status(self):
+        with self.lock:
+            return {
+                'crawls': len(self.running),
+                'max_crawls': self.maxCrawls,
+                'max_connections': self.maxConnections,
+            }
+
+    # Run a crawler extraction when there is a free crawl slot
+    async def run_crawler(self, crawler):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.maxCrawls)
+
+        async with self.semaphore:
+            try:
+                return await crawler.async_data_extraction(self)
+            except Exception as error:
+                print('Async extraction error: ' + str(error))
+                return 'Process aborted. ' + str(error)
+            finally:
+                # Closing the page archive waits for its writer, so it runs in the executor
+                await self.run_blocking(crawler.close)
+
+    # Run a blocking function in the executor without blocking the event loop
+    def run_blocking(self, function, *args):
+        return self.loop.run_in_executor(self.executor, partial(function, *args))
+
+    # Create an aiohttp session with its own cookies that shares the connection pool of the engine
+    def create_session(self):
+        import aiohttp
+
+        if self.connector is None:
+            self.connector = aiohttp.TCPConnector(limit=self.maxConnections)
+
+        return aiohttp.ClientSession(connector=self.connector, connector_owner=False,
+                                     cookie_jar=aiohttp.CookieJar(unsafe=True))
+
+    # Create a requests Response from the aiohttp response, so the crawlers process both engines the same way
+    @staticmethod
+    def create_response(response, content):
+        from requests.models import Response
+        from requests.structures import CaseInsensitiveDict
+
+        html_source = Response()
+        html_source.status_code = response.status
+        html_source.url = str(response.url)
+        html_source.headers = CaseInsensitiveDict(response.headers)
+        html_source.encoding = response.charset
+        html_source.reason = response.reason
+        html_source._content = content
+
+        return html_source
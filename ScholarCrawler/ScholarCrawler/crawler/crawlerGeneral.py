@@ -2,13 +2,14 @@
 Data crawler for the different types of requests
 """
 
-import os
-import datetime
-import shutil
+from .circuitBreaker import get_circuit_breaker
+from .pageArchive import create_page_sink
+from .rateLimiter import get_rate_limiter
+from .versionResolver import version_resolver
 
 
 # Create a Crawler object to make the data extraction or processing
-def create_crawler(user_data, desired_crawler):
+def create_crawler(user_data, desired_crawler, options=None):
     # Creates a crawler that will do the extraction and processing tasks
     crawler = Crawler
 
@@ -17,41 +18,81 @@ def create_crawler(user_data, desired_crawler):
         from crawler.googleScholarArticles import GoogleScholarArticles
         crawler = GoogleScholarArticles
 
-    return crawler(user_data)
+    return crawler(user_data, options)
 
 
-# Create a crawler object and extract the data
-def create_crawler_and_extract(user_data, desired_crawler):
-    return create_crawler(user_data, desired_crawler).data_extraction()
+# Create a crawler object and extract the data (with the engine selected in the options)
+def create_crawler_and_extract(user_data, desired_crawler, options=None):
+    crawler = create_crawler(user_data, desired_crawler, options)
+
+    if crawler.options['engine'] == 'async':
+        from .crawlerAsync import get_async_engine
+        return get_async_engine().submit(crawler)
+
+    # Close the page archive even if the extraction fails (the async engine closes it when the crawl ends)
+    try:
+        return crawler.data_extraction()
+    finally:
+        crawler.close()
+
+
+# Get the identity of a proxy configuration (used to group the requests that share the same exit point)
+def get_proxy_identity(proxy=None):
+    if not proxy:
+        return 'direct'
+
+    return proxy['https'] if 'https' in proxy else proxy.get('http', 'direct')
+
+
+# Get the address of a proxy configuration without its credentials (used in the logs and the status)
+def get_proxy_label(proxy=None):
+    from urllib.parse import urlparse
+
+    identity = get_proxy_identity(proxy)
+    if identity == 'direct':
+        return identity
+
+    url = urlparse(identity)
+    return url.scheme + '://' + (url.hostname or '') + (':' + str(url.port) if url.port else '')
 
 
 class Crawler(object):
     crawler_id = 'generalCrawler'
+    versionResolver = version_resolver
 
     # Extraction class to get the data user = system user
-    def __init__(self, user_data):
+    def __init__(self, user_data, options=None):
+        from requests import cookies
+        from ScholarCrawler import app
+
         self.userArr = user_data
 
-        # Set the extraction data save directories
-        directory = os.path.dirname(__file__)
-        self.tempDir = os.path.join(directory, 'storage/extractionTmp/' + self.crawler_id + '-' + user_data['id'] + '/')
+        # Crawler options (the job options override the default settings)
+        self.options = dict(app.config['CRAWLER_SETTINGS'])
+        self.options.update(options if options is not None else {})
 
-        # Clean the Temp directory before starting a new download (Remove it to have a clean download)
-        shutil.rmtree(self.tempDir, ignore_errors=True)
+        # Cookies shared by all the requests of the crawl and the HTTP sessions (one per proxy identity)
+        self.cookieJar = cookies.RequestsCookieJar()
+        self.sessions = {}
+        self.asyncSession = None
 
-        # Create the temp directory
-        os.makedirs(os.path.dirname(self.tempDir), exist_ok=True)
-        self.extractionZip = os.path.join(directory, 'storage/extraction/' + self.crawler_id + '-' + user_data['id'] +
-                                          '-' + str(datetime.datetime.now()))
+        # Archive of the downloaded pages (written by a background thread, see pageArchive)
+        self.pageArchive = create_page_sink(app.config['PAGE_STORAGE_SETTINGS'], self.crawler_id, user_data['id']) \
+            if self.options['page_storage'] else None
 
-    # Clean the temp files before quitting
-    def __del__(self):
-        self.delete_temp_file()
+    # Release the HTTP sessions and write the pending pages of the archive (call it when the crawl ends)
+    def close(self):
+        self.close_sessions()
+        if self.pageArchive is not None:
+            self.pageArchive.close()
 
-    # Zip the downloaded files and delete de temp files dir
-    def delete_temp_file(self):
-        shutil.make_archive(self.extractionZip, 'zip', self.tempDir)
-        shutil.rmtree(self.tempDir, ignore_errors=True)
+    # Last resort if the crawler wasn't closed (closing an archive twice does nothing). It doesn't wait for
+    # the archive writer, which may be already stopped if the interpreter is shutting down
+    def __del__(self):
+        if hasattr(self, 'pageArchive'):
+            self.close_sessions()
+            if self.pageArchive is not None:
+                self.pageArchive.close(wait=False)
 
     def crawler_extract_process(self):
         pass
@@ -60,19 +101,65 @@ class Crawler(object):
     def data_extraction(self):
         pass
 
+    # Override this method to make the data extraction in the async engine
+    async def async_data_extraction(self, engine):
+        pass
+
     # Override this method to make the data processing
     def data_process(self, html_source):
         pass
 
-    # Save the downloaded data into the HDD
-    def save_source_to_file(self, source, file_path):
-        with open(file_path, 'wb') as file:
-            file.write(source.content)
+    # Get the keep-alive HTTP session of the proxy identity (created on the first request)
+    def get_session(self, proxy=None):
+        from requests import Session
+        from requests.adapters import HTTPAdapter
+        from ScholarCrawler import app
+
+        identity = get_proxy_identity(proxy)
+        if identity in self.sessions:
+            return self.sessions[identity]
+
+        settings = app.config['HTTP_SESSION_SETTINGS']
+        adapter = HTTPAdapter(pool_connections=settings['pool_connections'], pool_maxsize=settings['pool_maxsize'],
+                              pool_block=settings['pool_block'])
+
+        session = Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.cookies = self.cookieJar
+
+        self.sessions[identity] = session
+        return session
+
+    # Close the HTTP sessions and their pooled connections
+    def close_sessions(self):
+        sessions = getattr(self, 'sessions', {})
+
+        for session in sessions.values():
+            session.close()
+
+        sessions.clear()
+
+    # Open the aiohttp session of the crawl (it uses the connection pool of the async engine)
+    def open_async_session(self, engine):
+        self.asyncSession = engine.create_session()
+        return self.asyncSession
+
+    # Close the aiohttp session of the crawl
+    async def close_async_session(self):
+        if self.asyncSession is not None:
+            await self.asyncSession.close()
+            self.asyncSession = None
+
+    # Add the downloaded data to the page archive (it doesn't wait for the disk)
+    def save_source_to_file(self, source, filename):
+        if self.pageArchive is not None:
+            self.pageArchive.add_page(filename, source.content)
 
     def extract_page(self, parameters):
-        from requests import Request, Session
-        from random import randint
-        from time import sleep
+        from requests import Request
+        from requests.exceptions import ConnectionError, Timeout
+        from time import sleep, time
 
         # Check if we have an url and filename
         if 'url' not in parameters:
@@ -113,14 +200,13 @@ class Crawler(object):
         current_retry = 1
         html_source = None
 
-        # Prepare the desired Request and make the download
-        session = Session()
+        # Prepare the desired Request (with the crawl cookies) using the persistent session of the proxy
+        session = self.get_session(proxy)
 
-        # html_source = requests.request('GET', url, headers=headers, proxies=self.proxies, cookies=self.cookieJar)
         desired_request = Request(parameters['requestType'], parameters['url'], headers=headers, params=params,
                                   data=data, cookies=cookies)
 
-        prepared_request = desired_request.prepare()
+        prepared_request = session.prepare_request(desired_request)
 
         error = {
             'error': True,
@@ -128,33 +214,272 @@ class Crawler(object):
         }
 
         while error['error'] and current_retry <= max_retries:
-            html_source = session.send(prepared_request, proxies=proxy)
-
-            # Check for error after the data download
-            error = self.extraction_error_check(html_source)
-            if error['error']:
+            identity = self.get_request_identity(parameters)
+
+            # Wait while the circuit of the host and proxy is open (a long pause aborts the request)
+            circuit_delay = self.get_circuit_delay(prepared_request.url, identity)
+            circuit_wait = 0
+            while circuit_delay > 0:
+                if circuit_wait + circuit_delay > get_circuit_breaker().maxWait:
+                    return self.get_circuit_error(prepared_request.url, identity)
+
+                sleep(circuit_delay)
+                circuit_wait += circuit_delay
+                circuit_delay = self.get_circuit_delay(prepared_request.url, identity)
+
+            # Wait for a free slot in the rate limiter of the host and proxy
+            sleep(self.get_request_delay(prepared_request.url, identity))
+
+            # The circuit always gets the result, so a recovery probe that raises an exception is released
+            error = self.get_request_error()
+            start = time()
+            try:
+                html_source = session.send(prepared_request, proxies=proxy)
+
+                # Check for error after the data download
+                error = self.extraction_error_check(html_source)
+            except (ConnectionError, Timeout) as exception:
+                # The proxy or the host can't be reached (scored as a failure of the endpoint)
+                error = self.get_connection_error(exception)
+            finally:
+                self.set_circuit_result(prepared_request.url, identity, error)
+            latency = time() - start
+
+            self.set_endpoint_result(parameters, error, latency)
+            if 'connection_error' in error:
+                # Without answer there is nothing to save, the last attempt returns the error
                 if current_retry == max_retries:
-                    filename = 'error-' + parameters['filename']
-                else:
-                    sleep(randint(retries_wait_range[0], retries_wait_range[1]))
-                    filename = 'retry-' + str(current_retry) + '-' + parameters['filename']
+                    return error
+
+                sleep(self.get_retry_wait(retries_wait_range, current_retry))
+
+                # Retry through another endpoint of the provider registry (if there is one)
+                if self.set_new_endpoint(parameters):
+                    proxy = parameters['proxy']
+                    session = self.get_session(proxy)
+                    prepared_request = session.prepare_request(desired_request)
             else:
-                filename = parameters['filename']
+                if error['error']:
+                    if current_retry == max_retries:
+                        filename = 'error-' + parameters['filename']
+                    else:
+                        sleep(self.get_retry_wait(retries_wait_range, current_retry))
+                        filename = 'retry-' + str(current_retry) + '-' + parameters['filename']
+                else:
+                    filename = parameters['filename']
 
-            # Save the downloaded data into the HDD
-            self.save_source_to_file(html_source, os.path.dirname(self.tempDir) + '/' + filename)
+                # Save the downloaded data into the page archive
+                self.save_source_to_file(html_source, filename)
 
             # Increase the request number and sleep a random time from the range
             current_retry = current_retry + 1
 
         return html_source
 
+    # Async version of extract_page, used by the async engine (same parameters and return values)
+    async def async_extract_page(self, parameters, engine):
+        import asyncio
+        from time import time
+        from aiohttp import ClientConnectionError
+        from requests import Request
+        from yarl import URL
+
+        # Check if we have an url and filename
+        if 'url' not in parameters:
+            return {
+                'error': True,
+                'error_message': 'No URL in the parameters',
+            }
+
+        if 'filename' not in parameters:
+            return {
+                'error': True,
+                'error_message': 'No FILENAME in the parameters',
+            }
+
+        proxy = parameters['proxy'] if 'proxy' in parameters else None
+
+        # aiohttp can't use SOCKS proxies, so those requests are made by extract_page in the blocking executor
+        if proxy and get_proxy_identity(proxy).startswith('socks'):
+            return await engine.run_blocking(self.extract_page, parameters)
+
+        # Prepare the URL, headers and body with requests to keep the same encoding of the parameters
+        prepared_request = Request(parameters['requestType'] if 'requestType' in parameters else 'GET',
+                                   parameters['url'],
+                                   headers=parameters['headers'] if 'headers' in parameters else None,
+                                   params=parameters['params'] if 'params' in parameters else None,
+                                   data=parameters['data'] if 'data' in parameters else None).prepare()
+
+        cookies = parameters['cookies'] if 'cookies' in parameters else None
+        max_retries = parameters['retries'] if 'retries' in parameters else 1
+        retries_wait_range = parameters['retries_wait_range'] if 'retries_wait_range' in parameters else [3, 5]
+        current_retry = 1
+        html_source = None
+
+        error = {
+            'error': True,
+            'error_message': 'First request',
+        }
+
+        while error['error'] and current_retry <= max_retries:
+            identity = self.get_request_identity(parameters)
+
+            # Wait while the circuit of the host and proxy is open (a long pause aborts the request)
+            circuit_delay = self.get_circuit_delay(prepared_request.url, identity)
+            circuit_wait = 0
+            while circuit_delay > 0:
+                if circuit_wait + circuit_delay > get_circuit_breaker().maxWait:
+                    return self.get_circuit_error(prepared_request.url, identity)
+
+                await asyncio.sleep(circuit_delay)
+                circuit_wait += circuit_delay
+                circuit_delay = self.get_circuit_delay(prepared_request.url, identity)
+
+            # Wait for a free slot in the rate limiter of the host and proxy (the sqlite backend blocks)
+            await asyncio.sleep(await engine.run_blocking(self.get_request_delay, prepared_request.url, identity))
+
+            # The circuit always gets the result, so a recovery probe that raises an exception is released
+            error = self.get_request_error()
+            start = time()
+            try:
+                async with self.asyncSession.request(prepared_request.method, URL(prepared_request.url, encoded=True),
+                                                     headers=dict(prepared_request.headers),
+                                                     data=prepared_request.body, cookies=cookies,
+                                                     proxy=get_proxy_identity(proxy) if proxy else None) as response:
+                    html_source = engine.create_response(response, await response.read())
+
+                # Check for error after the data download (it can rotate the proxy, so it runs in the executor)
+                error = await engine.run_blocking(self.extraction_error_check, html_source)
+            except (ClientConnectionError, asyncio.TimeoutError) as exception:
+                # The proxy or the host can't be reached (scored as a failure of the endpoint)
+                error = self.get_connection_error(exception)
+            finally:
+                self.set_circuit_result(prepared_request.url, identity, error)
+            latency = time() - start
+
+            self.set_endpoint_result(parameters, error, latency)
+            if 'connection_error' in error:
+                # Without answer there is nothing to save, the last attempt returns the error
+                if current_retry == max_retries:
+                    return error
+
+                await asyncio.sleep(self.get_retry_wait(retries_wait_range, current_retry))
+
+                # Retry through another endpoint of the provider registry (a SOCKS endpoint continues in the
+                # blocking executor with the remaining retries)
+                if await engine.run_blocking(self.set_new_endpoint, parameters):
+                    proxy = parameters['proxy']
+                    if get_proxy_identity(proxy).startswith('socks'):
+                        return await engine.run_blocking(self.extract_page,
+                                                         dict(parameters, retries=max_retries - current_retry))
+            else:
+                if error['error']:
+                    if current_retry == max_retries:
+                        filename = 'error-' + parameters['filename']
+                    else:
+                        await asyncio.sleep(self.get_retry_wait(retries_wait_range, current_retry))
+                        filename = 'retry-' + str(current_retry) + '-' + parameters['filename']
+                else:
+                    filename = parameters['filename']
+
+                # Save the downloaded data into the page archive
+                self.save_source_to_file(html_source, filename)
+
+            # Increase the request number
+            current_retry = current_retry + 1
+
+        return html_source
+
+    # Identity of the exit point of a request, without credentials: the endpoint of the provider registry (every
+    # rotation of its exit IP is a new identity) or the address of the proxy
+    def get_request_identity(self, parameters):
+        from .httpProviders.providerRegistry import get_provider_registry
+
+        if 'endpoint' in parameters and parameters['endpoint'] is not None:
+            return get_provider_registry().get_identity(parameters['endpoint'])
+
+        return get_proxy_label(parameters['proxy'] if 'proxy' in parameters else None)
+
+    # Key of the host and exit point identity of a request (used by the rate limiter and the circuit breaker)
+    def get_request_key(self, url, identity='direct'):
+        from urllib.parse import urlparse
+
+        return urlparse(url).netloc + '|' + identity
+
+    # Reserve a request slot in the rate limiter shared by all the crawlers (returns the seconds to wait)
+    def get_request_delay(self, url, identity='direct'):
+        return get_rate_limiter().reserve(self.get_request_key(url, identity))
+
+    # Seconds to wait until the circuit of the host and proxy allows a new request
+    def get_circuit_delay(self, url, identity='direct'):
+        return get_circuit_breaker().get_delay(self.get_request_key(url, identity))
+
+    # Update the circuit of the host and proxy with the result of a request (the blocks count as failures, and
+    # the other errors only fail the recovery probes)
+    def set_circuit_result(self, url, identity, error):
+        if error['error'] and 'blocked' in error and error['blocked']:
+            get_circuit_breaker().set_failure(self.get_request_key(url, identity))
+        elif error['error']:
+            get_circuit_breaker().set_error(self.get_request_key(url, identity))
+        else:
+            get_circuit_breaker().set_success(self.get_request_key(url, identity))
+
+    # Error of a request without answer (the request raised an exception)
+    def get_request_error(self):
+        return {
+            'error': True,
+            'error_message': 'Request failed',
+            'blocked': False,
+        }
+
+    # Error of a request that couldn't connect to the proxy or the host (only the exception type is kept, the
+    # message can contain the proxy URL)
+    def get_connection_error(self, exception):
+        return {
+            'error': True,
+            'error_message': 'Connection error (' + type(exception).__name__ + ')',
+            'blocked': False,
+            'connection_error': True,
+        }
+
+    # Override this method to choose another proxy endpoint for the request after a connection error (it updates
+    # the 'proxy' and 'endpoint' parameters and returns True if the endpoint changed)
+    def set_new_endpoint(self, parameters):
+        return False
+
+    # Update the health score of the proxy endpoint of the request (if it was made through the provider registry)
+    def set_endpoint_result(self, parameters, error, latency):
+        from .httpProviders.providerRegistry import get_provider_registry
+
+        if 'endpoint' in parameters and parameters['endpoint'] is not None:
+            get_provider_registry().set_result(parameters['endpoint'], not error['error'],
+                                               'blocked' in error and error['blocked'], latency)
+
+    # Error returned when the circuit of the host and proxy stays open for too long
+    def get_circuit_error(self, url, identity='direct'):
+        return {
+            'error': True,
+            'error_message': 'Requests paused for ' + self.get_request_key(url, identity) + ' after repeated blocks',
+        }
+
+    # Exponential backoff with jitter: random wait from the range, which doubles on every retry (with a max wait)
+    def get_retry_wait(self, retries_wait_range, retry):
+        from random import uniform
+        from ScholarCrawler import app
+
+        settings = app.config['BACKOFF_SETTINGS']
+        multiplier = settings['multiplier'] ** (retry - 1)
+
+        return min(settings['max_wait'], uniform(retries_wait_range[0] * multiplier,
+                                                 retries_wait_range[1] * multiplier))
+
     # Checks for possible errors in the download
     def extraction_error_check(self, html_source):
         if html_source.status_code >= 400:
             return {
                 'error': True,
                 'error_message': 'Download error',
+                'blocked': html_source.status_code in (429, 503),
             }
 
         return {
@@ -162,24 +487,52 @@ class Crawler(object):
             'error_message': '',
         }
 
-    # Function to iterate through a list of function names to get a String
+    # Run a CSS selector over the source, reusing the result if it was already evaluated with the same params
+    def select_source(self, source, selector, params=None):
+        if params is None or 'selections' not in params:
+            return source.select(selector)
+
+        if selector not in params['selections']:
+            params['selections'][selector] = source.select(selector)
+
+        return params['selections'][selector]
+
+    # Domain used to remember the matching extractor versions
+    def get_version_domain(self):
+        return getattr(self, 'domain', self.crawler_id)
+
+    # Function to iterate through a list of function names to get a String (last matching version first)
     def find_version_text(self, version_list, source, params=None):
-        for version in version_list:
-            function = getattr(self, version)
+        domain = self.get_version_domain()
+        field = self.versionResolver.get_field(version_list)
+        attempts = 0
+
+        for version in self.versionResolver.get_versions(domain, field, version_list):
+            function = self.versionResolver.get_function(type(self), version)
+            attempts += 1
 
-            text = function(source, params)
-            if isinstance(text, str) and text is not '':
+            text = function(self, source, params)
+            if isinstance(text, str) and text != '':
+                self.versionResolver.set_match(domain, field, version, attempts)
                 return text
 
+        self.versionResolver.set_match(domain, field, None, attempts)
         return None
 
-    # Function to iterate through a list of function names to get a List/dictionary
+    # Function to iterate through a list of function names to get a List/dictionary (last matching version first)
     def find_version_array(self, version_list, source, params=None):
-        for version in version_list:
-            function = getattr(self, version)
+        domain = self.get_version_domain()
+        field = self.versionResolver.get_field(version_list)
+        attempts = 0
+
+        for version in self.versionResolver.get_versions(domain, field, version_list):
+            function = self.versionResolver.get_function(type(self), version)
+            attempts += 1
 
-            array = function(source, params)
+            array = function(self, source, params)
             if isinstance(array, (list, dict)) and array:
+                self.versionResolver.set_match(domain, field, version, attempts)
                 return array
 
+        self.versionResolver.set_match(domain, field, None, attempts)
         return None
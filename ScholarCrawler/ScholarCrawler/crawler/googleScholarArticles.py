@@ -2,35 +2,53 @@
 Package to extract the Google Scholar data using cli tools (like curl, requests,...)
 """
 
+import datetime
 import re
 from fake_useragent import UserAgent
-from bs4 import BeautifulSoup
-
 from .crawlerGeneral import *
+from .htmlParsers.factory import create_html_parser
 
 
 class GoogleScholarArticles(Crawler):
     crawler_id = 'googleScholarArticles'
 
-    def __init__(self, user_data):
-        from requests import cookies
+    # Patterns used by the extractors (compiled once, when the class is loaded)
+    regexUrl = re.compile(r'/scholar\?', re.IGNORECASE)
+    regexDate20181018 = re.compile(r'\s(\d{4})\s-')
+    regexQuotes20190413 = re.compile(r'Citado por\s*(\d+)', re.IGNORECASE)
+    regexQuotes20181018 = re.compile(r'Cited by\s(\d+)', re.IGNORECASE)
+    regexVersions20190413 = re.compile(r'Las\s*(\d+)\s*versi', re.IGNORECASE)
+    regexVersions20181018 = re.compile(r'All\s*(\d+)\s*version', re.IGNORECASE)
+
+    # Article fields compared in the incremental mode to know if a stored article changed
+    articleFields = ['title', 'date', 'source', 'description', 'quotes', 'versions', 'related', 'authors']
+
+    def __init__(self, user_data, options=None):
+        from ScholarCrawler import app
 
-        super().__init__(user_data)
+        super().__init__(user_data, options)
 
-        self.domain = 'scholar.google.es'
+        self.domain = self.options['scholar_domain']
+        self.scheme = self.options['scholar_scheme']
         self.scholarUser = user_data['scholarUser']
         self.scholarAliases = user_data['scholarAliases']
         self.unusedScholarAliases = []
         self.lastRequestUrl = ''
         self.repoUserId = user_data['id']
         self.user = user_data['user']
-        self.cookieJar = cookies.RequestsCookieJar()
         self.pages = 1
+        self.articlesCount = 0
+        self.unchangedCount = 0
+        self.writeCounts = {'matched': 0, 'upserted': 0, 'modified': 0, 'unchanged': 0}
+        self.incrementalStop = False
+        self.crawlDate = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        self.proxyEndpoint = None
+        self.htmlParser = create_html_parser(app.config['HTML_PARSER'])
+        self.shareSelections = True
 
     # Make the articles extraction
     def data_extraction(self):
         # Start the data extraction
-        articles_count = 0
         url = None
         continue_extraction = True
 
@@ -39,14 +57,26 @@ class GoogleScholarArticles(Crawler):
 
         # Extract the main portal page
         query_parameters = self.generate_main_page_query()
+        if 'proxy' in query_parameters and query_parameters['proxy'] is None:
+            return 'Process aborted. Proxy connection failure'
+
         html_source = self.extract_page(query_parameters)
         self.lastRequestUrl = query_parameters['url']
 
         # Extract the NID generation page
         query_parameters = self.generate_nid_query()
+        if 'proxy' in query_parameters and query_parameters['proxy'] is None:
+            return 'Process aborted. Proxy connection failure'
+
         html_source = self.extract_page(query_parameters)
         self.lastRequestUrl = query_parameters['url']
 
+        # Pipelined extraction (the next page is downloaded while the current one is processed and stored)
+        if self.options['pipeline']:
+            summary = self.pipeline_data_extraction()
+            self.close_sessions()
+            return summary
+
         while continue_extraction:
             # Generate the query Parameters
             query_parameters = self.generate_query(url)
@@ -55,48 +85,194 @@ class GoogleScholarArticles(Crawler):
             if 'proxy' in query_parameters and query_parameters['proxy'] is None:
                 return 'Process aborted. Proxy connection failure'
 
-            # Download the page and save it in the tempDir
+            # Download the page and save it in the page archive
             html_source = self.extract_page(query_parameters)
             self.lastRequestUrl = query_parameters['url']
 
             # process the downloaded data
             data = self.data_process(html_source)
 
-            # Check if the articles contain the user as author
-            if data is not None and 'articles' in data and data['articles'] is not None:
-                # get next page url
-                url = self.get_next_page_url(html_source.content)
+            # Get the next page url (None when the extraction is finished)
+            url = self.get_next_extraction_url(data)
+            continue_extraction = url is not None
+
+        # Release the HTTP connections of the crawl
+        self.close_sessions()
+
+        return self.get_extraction_summary()
+
+    # Make the articles extraction in the async engine (same steps as data_extraction, without blocking waits)
+    async def async_data_extraction(self, engine):
+        url = None
+        continue_extraction = True
+
+        self.open_async_session(engine)
+
+        try:
+            # Extract the main portal page and the NID generation page (the queries choose the proxy and the user
+            # agent, which can block, so they are generated in the executor)
+            for generate_query in (self.generate_main_page_query, self.generate_nid_query):
+                query_parameters = await engine.run_blocking(generate_query)
+                if 'proxy' in query_parameters and query_parameters['proxy'] is None:
+                    return 'Process aborted. Proxy connection failure'
+
+                await self.async_extract_page(query_parameters, engine)
+                self.lastRequestUrl = query_parameters['url']
+
+            while continue_extraction:
+                # Generate the query Parameters
+                query_parameters = await engine.run_blocking(self.generate_query, url)
+
+                # Check possible errors withe the proxy
+                if 'proxy' in query_parameters and query_parameters['proxy'] is None:
+                    return 'Process aborted. Proxy connection failure'
+
+                # Download the page and save it in the page archive
+                html_source = await self.async_extract_page(query_parameters, engine)
+                self.lastRequestUrl = query_parameters['url']
+
+                # process the downloaded data (the repository calls are blocking)
+                data = await engine.run_blocking(self.data_process, html_source)
+
+                # Get the next page url (None when the extraction is finished)
+                url = self.get_next_extraction_url(data)
+                continue_extraction = url is not None
+        finally:
+            await self.close_async_session()
+
+        return self.get_extraction_summary()
+
+    # Make the articles pages extraction as a pipeline of 2 stages joined by a bounded queue: download, process and
+    # compare with the stored articles (this thread) and storage (worker thread). The download of the page N+1
+    # overlaps the storage of the page N, and waits when the queue is full (the storage fell behind). The page
+    # counter and the stop checks (page and article limits, incremental stop) stay in this thread, so they are
+    # checked before the next download and no page is downloaded past the stop point
+    def pipeline_data_extraction(self):
+        import queue
+        import threading
+        from models.factory import connect_to_database
+        from ScholarCrawler import app
+
+        data_queue = queue.Queue(self.options['pipeline_queue_size'])
+        end = object()
+        errors = []
+
+        # Store the pages until the end mark (after an error the next pages are discarded)
+        def store_pages():
+            db = connect_to_database(app.config['REPOSITORY_NAME'], app.config['REPOSITORY_SETTINGS'])
+
+            while True:
+                item = data_queue.get()
+                if item is end:
+                    break
+
+                if errors:
+                    continue
 
-                self.pages = self.pages + 1
-                articles_count += len(list(data['articles']))
+                page, data, articles = item
+                try:
+                    self.write_data(db, data, articles)
+                except Exception as error:
+                    errors.append('Storage error at page ' + str(page) + ': ' + str(error))
 
-                # print('   Next Url: ' + str(url))  # TODO Test
-                # print('    Articles processed: ' + str(len(list(data['articles']))))  # TODO Tests
+        storage = threading.Thread(target=store_pages)
+        storage.start()
 
-            else:
-                url = ''
+        db = connect_to_database(app.config['REPOSITORY_NAME'], app.config['REPOSITORY_SETTINGS']) \
+            if self.options['incremental'] else None
+        url = None
+        summary = None
+
+        try:
+            while not errors:
+                # Generate the query Parameters
+                query_parameters = self.generate_query(url)
+
+                # Check possible errors withe the proxy
+                if 'proxy' in query_parameters and query_parameters['proxy'] is None:
+                    summary = 'Process aborted. Proxy connection failure'
+                    break
+
+                # Download the page and save it in the page archive
+                html_source = self.extract_page(query_parameters)
+                self.lastRequestUrl = query_parameters['url']
+
+                if 'error' in html_source:
+                    break
+
+                # Process the page (in the incremental mode only the new and changed articles are stored) and
+                # send it to the storage with its page number. A page without articles (captcha after the last
+                # retry, no results) isn't stored and ends the extraction, like in data_process
+                data = self.process_page(html_source.content)
+                if data is not None and data['articles'] is not None:
+                    articles = self.get_changed_articles(db, data) if self.options['incremental'] \
+                        else data['articles']
+                    data_queue.put((self.pages, data, articles))
+
+                # Get the next page url (None when the extraction is finished)
+                url = self.get_next_extraction_url(data)
+                if url is None:
+                    break
+        finally:
+            # Wait until the storage of the queued pages finishes
+            data_queue.put(end)
+            storage.join()
+
+        if errors:
+            return 'Process aborted. ' + errors[0]
+
+        return summary if summary is not None else self.get_extraction_summary()
+
+    # Update the extraction counters with the processed page and get the next page url
+    def get_next_extraction_url(self, data):
+        url = ''
+
+        # Check if the articles contain the user as author
+        if data is not None and 'articles' in data and data['articles'] is not None:
+            # get next page url (already extracted from the parsed page)
+            url = data['next_page_url']
+
+            self.pages = self.pages + 1
+            self.articlesCount += len(list(data['articles']))
+
+            # print('   Next Url: ' + str(url))  # TODO Test
+            # print('    Articles processed: ' + str(len(list(data['articles']))))  # TODO Tests
+
+        # In the incremental mode stop when a page has only already known and unchanged articles
+        if self.options['incremental'] and data is not None and 'all_known' in data and data['all_known']:
+            self.incrementalStop = True
+            return None
+
+        # TODO Tests (Limit the max number of extractions to avoid a Google Ban/Captcha)
+        if self.articlesCount >= 200 or self.pages >= 20:
+            return None
 
-            # TODO Tests (Limit the max number of extractions to avoid a Google Ban/Captcha)
-            if articles_count >= 200 or self.pages >= 20:
-                continue_extraction = False
-            else:
-                # Check if the URL is valid
-                continue_extraction = self.validate_url(url)
+        # Check if the URL is valid
+        return url if self.validate_url(url) else None
 
+    # Get the extraction statistics at the end of the process
+    def get_extraction_summary(self):
         # TODO Test message for debugging
-        print('\nExtraction for ' + self.scholarUser + ' finished with ' + str(articles_count) + ' articles\n')
+        print('\nExtraction for ' + self.scholarUser + ' finished with ' + str(self.articlesCount) + ' articles\n')
 
         # Return the job statistics
-        return 'Process finished. Articles: ' + str(articles_count)
+        summary = 'Process finished. Articles: ' + str(self.articlesCount) + '. New articles: ' + \
+                  str(self.writeCounts['upserted']) + '. Updated articles: ' + str(self.writeCounts['modified']) + \
+                  '. Unchanged articles: ' + str(self.writeCounts['unchanged'] + self.unchangedCount)
+
+        # The pages that weren't requested in the incremental mode, up to the max pages limit of the extraction
+        if self.incrementalStop:
+            summary += '. Incremental stop at page ' + str(self.pages - 1) + ', pages saved: up to ' + \
+                       str(20 - self.pages)
+
+        return summary
 
     # Function to check if the URL is valid, to continue the extraction
     def validate_url(self, url=None):
         if url is None:
             return False
 
-        regex = re.compile('/scholar\?', re.IGNORECASE)
-
-        return True if regex.match(url) else False
+        return True if self.regexUrl.match(url) else False
 
     # Function to generate the Data extraction query parameters
     def generate_query(self, url=None):
@@ -104,7 +280,8 @@ class GoogleScholarArticles(Crawler):
             'url': self.generate_articles_url(),
             'params': self.generate_articles_get_parameters(url),
             'headers': self.generate_articles_headers(),
-            # 'proxy': self.generate_articles_proxy(),  # Uncomment to use Tor
+            'proxy': self.generate_articles_proxy(),
+            'endpoint': self.proxyEndpoint,
             'filename': self.generate_articles_filename(),
             'retries': 3,
             'retries_wait_range': [6, 10],
@@ -115,7 +292,8 @@ class GoogleScholarArticles(Crawler):
         return {
             'url': self.generate_main_page_url(),
             'headers': self.generate_articles_headers(),
-            # 'proxy': self.generate_articles_proxy(),  # Uncomment to use Tor
+            'proxy': self.generate_articles_proxy(),
+            'endpoint': self.proxyEndpoint,
             'filename': self.generate_main_page_filename(),
             'retries': 2,
             'retries_wait_range': [6, 10],
@@ -126,7 +304,8 @@ class GoogleScholarArticles(Crawler):
         return {
             'url': self.generate_nid_url(),
             'headers': self.generate_articles_headers(),
-            # 'proxy': self.generate_articles_proxy(),  # Uncomment to use Tor
+            'proxy': self.generate_articles_proxy(),
+            'endpoint': self.proxyEndpoint,
             'filename': self.generate_nid_filename(),
             'retries': 2,
             'retries_wait_range': [6, 10],
@@ -134,15 +313,15 @@ class GoogleScholarArticles(Crawler):
 
     # Function to generate the articles extraction Url
     def generate_articles_url(self):
-        return 'https://' + self.domain + '/scholar'
+        return self.scheme + '://' + self.domain + '/scholar'
 
     # Function to generate the articles extraction Url
     def generate_main_page_url(self):
-        return 'https://' + self.domain
+        return self.scheme + '://' + self.domain
 
     # Function to generate the articles extraction Url
     def generate_nid_url(self):
-        return 'https://' + self.domain + '/gen_nid'
+        return self.scheme + '://' + self.domain + '/gen_nid'
 
     # Function to generate the articles extraction GET Parameters
     def generate_articles_get_parameters(self, url=None):
@@ -172,10 +351,37 @@ class GoogleScholarArticles(Crawler):
             'Upgrade-Insecure-Requests': '1'
         }
 
-    # Function to generate the Proxy Settings (Proxy settings)
+    # Function to generate the Proxy Settings (the crawl keeps the same endpoint while it's available, otherwise
+    # another one is chosen)
     def generate_articles_proxy(self):
-        from .httpProviders.proxyTor import ProxyTor
-        return ProxyTor().set_connection()
+        from .httpProviders.providerRegistry import get_provider_registry
+
+        failed = None
+        if self.proxyEndpoint is not None:
+            proxy = get_provider_registry().set_connection(self.proxyEndpoint)
+            if proxy is not None:
+                return proxy
+
+            failed = [self.proxyEndpoint]
+
+        self.proxyEndpoint, proxy = get_provider_registry().get_connection(exclude=failed)
+        return proxy
+
+    # Choose another endpoint after a connection error (the next queries of the crawl also use the new endpoint)
+    def set_new_endpoint(self, parameters):
+        from .httpProviders.providerRegistry import get_provider_registry
+
+        if 'endpoint' not in parameters or parameters['endpoint'] is None:
+            return False
+
+        endpoint, proxy = get_provider_registry().get_connection(exclude=[parameters['endpoint']])
+        if endpoint is None or endpoint == parameters['endpoint']:
+            return False
+
+        self.proxyEndpoint = endpoint
+        parameters['endpoint'] = endpoint
+        parameters['proxy'] = proxy
+        return True
 
     # Function to generate the articles extraction query filename
     def generate_articles_filename(self, extension='.html'):
@@ -196,10 +402,6 @@ class GoogleScholarArticles(Crawler):
 
     # Data processing
     def data_process(self, html_source):
-        # Import the factory
-        from models.factory import connect_to_database
-        from ScholarCrawler import app
-
         # Check if we got an error during the extraction
         if 'error' in html_source:
             data = {
@@ -211,34 +413,86 @@ class GoogleScholarArticles(Crawler):
             data = self.process_page(html_source.content)
 
             # Add the user articles to the DB and the unknown/new aliases
-            if data is not None:
-                db = connect_to_database(app.config['REPOSITORY_NAME'], app.config['REPOSITORY_SETTINGS'])
+            self.store_data(data)
 
-                if 'articles' in data and data['articles'] is not None:
-                    db.add_new_articles(self.repoUserId, data['articles'])
+        return data
 
-                if 'unknown_aliases' in data and data['unknown_aliases'] is not None:
-                    db.add_new_unused_aliases(self.repoUserId, data['unknown_aliases'])
+    # Store the processed page data: the user articles and the unknown/new aliases
+    def store_data(self, data):
+        # Import the factory
+        from models.factory import connect_to_database
+        from ScholarCrawler import app
 
-        return data
+        if data is None or data['articles'] is None:
+            return None
 
-    # Process the Google Scholar articles page
+        db = connect_to_database(app.config['REPOSITORY_NAME'], app.config['REPOSITORY_SETTINGS'])
+
+        # In the incremental mode only the new and changed articles are stored
+        articles = self.get_changed_articles(db, data) if self.options['incremental'] else data['articles']
+        self.write_data(db, data, articles)
+
+    # Write the articles of the processed page and the unknown/new aliases in the repository (the stored articles
+    # read by get_changed_articles are reused by the repository to compare them)
+    def write_data(self, db, data, articles):
+        if articles:
+            self.add_write_counts(db.add_new_articles(self.repoUserId, articles, self.crawlDate, data.get('stored')))
+
+        if 'unknown_aliases' in data and data['unknown_aliases'] is not None:
+            db.add_new_unused_aliases(self.repoUserId, data['unknown_aliases'])
+
+    # Accumulate the repository write counts of the crawl
+    def add_write_counts(self, counts):
+        if counts is None:
+            return
+
+        for key in self.writeCounts:
+            self.writeCounts[key] += counts[key] if key in counts else 0
+
+    # Compare the page articles with the stored ones and return the new or changed articles
+    def get_changed_articles(self, db, data):
+        if 'articles' not in data or not data['articles']:
+            return data['articles'] if 'articles' in data else None
+
+        stored = db.get_articles_by_ids(self.repoUserId, [article['articleId'] for article in data['articles']])
+        stored = stored if stored is not None else {}
+        data['stored'] = stored
+
+        changed = []
+        for article in data['articles']:
+            stored_article = stored[article['articleId']] if article['articleId'] in stored else None
+
+            if stored_article is None or any(stored_article.get(field) != article[field]
+                                             for field in self.articleFields):
+                changed.append(article)
+
+        # Flag the pages with only known articles to stop the extraction
+        data['all_known'] = not changed
+        self.unchangedCount += len(data['articles']) - len(changed)
+
+        return changed
+
+    # Process the Google Scholar articles page (the page is parsed only once)
     def process_page(self, html_source):
         output = {
             'articles': [],
             'unknown_aliases': [],
+            'next_page_url': None,
         }
 
         # Load the DOM Crawler and filter the articles from the HTML
-        soup = BeautifulSoup(html_source, 'html5lib')
+        soup = html_source if self.htmlParser.is_node(html_source) else self.htmlParser.parse(html_source)
         articles = self.get_articles_list(soup)
 
         if articles is None:
             return None
 
+        # Get the next page url from the same parsed document
+        output['next_page_url'] = self.get_next_page_url(soup)
+
         for article in articles:
             # print('   Next article: ' + article.get_text()) # TODO Test
-            data = self.process_article(str(article))
+            data = self.process_article(article)
 
             # Add the data to it's corresponding group
             if data is not None and 'authors' in data:
@@ -251,29 +505,33 @@ class GoogleScholarArticles(Crawler):
 
         return output
 
-    # Process an article
+    # Process an article (the extractors run directly on the article subtree)
     def process_article(self, article_source):
-        soup = BeautifulSoup(article_source, 'html5lib')
+        soup = article_source if self.htmlParser.is_node(article_source) else \
+            self.htmlParser.parse(article_source)
+
+        # Shared selections, every selector is evaluated only once per article
+        params = {'selections': {}} if self.shareSelections else None
 
         # Get the Article title
-        title = self.get_article_title(soup)
+        title = self.get_article_title(soup, params)
 
         # Get the authors
-        authors = self.get_article_authors(soup)
+        authors = self.get_article_authors(soup, params)
 
         # Check to know if we got the user profile field or an article
         if title is None or authors is None:
             return None
 
         article = {
-            'articleId': self.get_article_id(soup),             # Get the article Id
+            'articleId': self.get_article_id(soup, params),             # Get the article Id
             'title': title,
-            'date': self.get_article_date(soup),                # Get the article date
-            'source': self.get_article_source_url(soup),        # Get the source URL
-            'description': self.get_article_description(soup),  # Get the Article description
-            'quotes': self.get_article_quotes(soup),            # Find how many times has been quoted
-            'versions': self.get_article_versions(soup),
-            'related': self.get_article_related_urls(soup),     # Get the related articles URL
+            'date': self.get_article_date(soup, params),                # Get the article date
+            'source': self.get_article_source_url(soup, params),        # Get the source URL
+            'description': self.get_article_description(soup, params),  # Get the Article description
+            'quotes': self.get_article_quotes(soup, params),            # Find how many times has been quoted
+            'versions': self.get_article_versions(soup, params),
+            'related': self.get_article_related_urls(soup, params),     # Get the related articles URL
             'authors': authors
         }
 
@@ -290,7 +548,7 @@ class GoogleScholarArticles(Crawler):
 
     # Get the articles list (version: 2018-10-18)
     def get_articles_list_20181018(self, source, params=None):
-        if not isinstance(source, BeautifulSoup):
+        if not self.htmlParser.is_node(source):
             return None
 
         return source.select('.gs_r')
@@ -305,10 +563,10 @@ class GoogleScholarArticles(Crawler):
 
     # Get the article title (version: 2018-10-18)
     def get_article_title_20181018(self, source, params=None):
-        if not isinstance(source, BeautifulSoup):
+        if not self.htmlParser.is_node(source):
             return None
 
-        titles = source.select('.gs_ri > .gs_rt > a')
+        titles = self.select_source(source, '.gs_ri > .gs_rt > a', params)
         for title in titles:
             return title.get_text()
         return None
@@ -323,11 +581,11 @@ class GoogleScholarArticles(Crawler):
 
     # Get the article Authors (version: 2018-10-18)
     def get_article_authors_20181018(self, source, params=None):
-        if not isinstance(source, BeautifulSoup):
+        if not self.htmlParser.is_node(source):
             return None
 
         authors_list = []
-        authors = source.select('.gs_ri > .gs_a > a')
+        authors = self.select_source(source, '.gs_ri > .gs_a > a', params)
         for author in authors:
             authors_list.append(author.get_text())
 
@@ -343,10 +601,11 @@ class GoogleScholarArticles(Crawler):
 
     # Get the article id (version: 2018-10-18)
     def get_article_id_20181018(self, source, params=None):
-        if not isinstance(source, BeautifulSoup):
+        if not self.htmlParser.is_node(source):
             return None
 
-        article_id = source.select('.gs_r')
+        # The source can be the article node itself or a document that contains it
+        article_id = [source] if 'gs_r' in source.get('class', []) else self.select_source(source, '.gs_r', params)
 
         return article_id[0]['data-cid'] if len(article_id) > 0 and 'data-cid' in article_id[0].attrs else None
 
@@ -360,10 +619,10 @@ class GoogleScholarArticles(Crawler):
 
     # Get the article description (version: 2018-10-18)
     def get_article_description_20181018(self, source, params=None):
-        if not isinstance(source, BeautifulSoup):
+        if not self.htmlParser.is_node(source):
             return None
 
-        descriptions = source.select('.gs_ri > .gs_rs')
+        descriptions = self.select_source(source, '.gs_ri > .gs_rs', params)
         for description in descriptions:
             return description.get_text()
         return None
@@ -378,13 +637,12 @@ class GoogleScholarArticles(Crawler):
 
     # Get the article date (version: 2018-10-18)
     def get_article_date_20181018(self, source, params=None):
-        if not isinstance(source, BeautifulSoup):
+        if not self.htmlParser.is_node(source):
             return None
 
-        dates = source.select('.gs_ri > .gs_a')
+        dates = self.select_source(source, '.gs_ri > .gs_a', params)
         for date in dates:
-            regex = re.compile('\s(\d{4})\s-')
-            return str(regex.findall(date.get_text())[0])
+            return str(self.regexDate20181018.findall(date.get_text())[0])
         return None
 
     # Get the article source url
@@ -397,10 +655,10 @@ class GoogleScholarArticles(Crawler):
 
     # Get the article source url (version: 2018-10-18)
     def get_article_source_url_20181018(self, source, params=None):
-        if not isinstance(source, BeautifulSoup):
+        if not self.htmlParser.is_node(source):
             return None
 
-        sources_urls = source.select('.gs_ri > .gs_rt > a')
+        sources_urls = self.select_source(source, '.gs_ri > .gs_rt > a', params)
         for url in sources_urls:
             return url['href']
         return None
@@ -415,10 +673,10 @@ class GoogleScholarArticles(Crawler):
 
     # Get the article bottom line (version: 2018-10-18)
     def get_article_bottom_line_20181018(self, source, params=None):
-        if not isinstance(source, BeautifulSoup):
+        if not self.htmlParser.is_node(source):
             return None
 
-        return source.select('.gs_ri > .gs_fl > a')
+        return self.select_source(source, '.gs_ri > .gs_fl > a', params)
 
     # Get the article quotes
     def get_article_quotes(self, source, params=None):
@@ -433,7 +691,7 @@ class GoogleScholarArticles(Crawler):
 
     # Get the article quotes (version: 2019-04-13)
     def get_article_quotes_20190413(self, source, params=None):
-        if not isinstance(source, BeautifulSoup):
+        if not self.htmlParser.is_node(source):
             return None
 
         bottom_line = self.get_article_bottom_line(source, params)
@@ -441,16 +699,16 @@ class GoogleScholarArticles(Crawler):
         if bottom_line is None or not bottom_line:
             return None
 
-        regex = re.compile('Citado por\s*(\d+)', re.IGNORECASE)
         for part in bottom_line:
-            if regex.match(part.get_text()):
-                return str(regex.match(part.get_text())[1])
+            match = self.regexQuotes20190413.match(part.get_text())
+            if match:
+                return str(match[1])
 
         return None
 
     # Get the article quotes (version: 2018-10-18)
     def get_article_quotes_20181018(self, source, params=None):
-        if not isinstance(source, BeautifulSoup):
+        if not self.htmlParser.is_node(source):
             return None
 
         bottom_line = self.get_article_bottom_line(source, params)
@@ -458,10 +716,10 @@ class GoogleScholarArticles(Crawler):
         if bottom_line is None or not bottom_line:
             return None
 
-        regex = re.compile('Cited by\s(\d+)', re.IGNORECASE)
         for part in bottom_line:
-            if regex.match(part.get_text()):
-                return str(regex.match(part.get_text())[1])
+            match = self.regexQuotes20181018.match(part.get_text())
+            if match:
+                return str(match[1])
 
         return None
 
@@ -476,7 +734,7 @@ class GoogleScholarArticles(Crawler):
 
     # Get the article related articles urls (version: 2019-04-13)
     def get_article_related_urls_20190413(self, source, params=None):
-        if not isinstance(source, BeautifulSoup):
+        if not self.htmlParser.is_node(source):
             return None
 
         bottom_line = self.get_article_bottom_line(source, params)
@@ -486,13 +744,13 @@ class GoogleScholarArticles(Crawler):
 
         for part in bottom_line:
             if part.get_text().find('Artículos relacionados') != -1:
-                return 'https://' + self.domain + str(part['href'])
+                return self.scheme + '://' + self.domain + str(part['href'])
 
         return None
 
     # Get the article related articles urls (version: 2018-10-18)
     def get_article_related_urls_20181018(self, source, params=None):
-        if not isinstance(source, BeautifulSoup):
+        if not self.htmlParser.is_node(source):
             return None
 
         bottom_line = self.get_article_bottom_line(source, params)
@@ -502,7 +760,7 @@ class GoogleScholarArticles(Crawler):
 
         for part in bottom_line:
             if part.get_text().find('Related articles') != -1:
-                return 'https://' + self.domain + str(part['href'])
+                return self.scheme + '://' + self.domain + str(part['href'])
 
         return None
 
@@ -519,7 +777,7 @@ class GoogleScholarArticles(Crawler):
 
     # Get the article version (version: 2019-04-13)
     def get_article_versions_20190413(self, source, params=None):
-        if not isinstance(source, BeautifulSoup):
+        if not self.htmlParser.is_node(source):
             return None
 
         bottom_line = self.get_article_bottom_line(source, params)
@@ -527,16 +785,16 @@ class GoogleScholarArticles(Crawler):
         if bottom_line is None or not bottom_line:
             return None
 
-        regex = re.compile('Las\s*(\d+)\s*versi', re.IGNORECASE)
         for part in bottom_line:
-            if regex.match(part.get_text()):
-                return str(regex.match(part.get_text())[1])
+            match = self.regexVersions20190413.match(part.get_text())
+            if match:
+                return str(match[1])
 
         return None
 
     # Get the article version (version: 2018-10-18)
     def get_article_versions_20181018(self, source, params=None):
-        if not isinstance(source, BeautifulSoup):
+        if not self.htmlParser.is_node(source):
             return None
 
         bottom_line = self.get_article_bottom_line(source, params)
@@ -544,10 +802,10 @@ class GoogleScholarArticles(Crawler):
         if bottom_line is None or not bottom_line:
             return None
 
-        regex = re.compile('All\s*(\d+)\s*version', re.IGNORECASE)
         for part in bottom_line:
-            if regex.match(part.get_text()):
-                return str(regex.match(part.get_text())[1])
+            match = self.regexVersions20181018.match(part.get_text())
+            if match:
+                return str(match[1])
 
         return None
 
@@ -561,8 +819,8 @@ class GoogleScholarArticles(Crawler):
 
     # Get the next Page URL (version: 2018-10-18)
     def get_next_page_url_20181018(self, source, params=None):
-        if not isinstance(source, BeautifulSoup):
-            source = BeautifulSoup(source, 'html5lib')
+        if not self.htmlParser.is_node(source):
+            source = self.htmlParser.parse(source)
 
         url = source.select('#gs_n td[align~=left] > a')
 
@@ -574,11 +832,16 @@ class GoogleScholarArticles(Crawler):
 
         # Check if there're captcha in the HTML to Rotate the IP (Connect to a new Tor circuit)
         if "captcha" in html_source.text:
-            from .httpProviders.proxyTor import ProxyTor
-            ProxyTor().rotate_ip()
+            if self.proxyEndpoint is not None:
+                from .httpProviders.providerRegistry import get_provider_registry
+
+                # Choose another endpoint on the next query when this one can't change its exit IP
+                if get_provider_registry().rotate_ip(self.proxyEndpoint) is None:
+                    self.proxyEndpoint = None
             error = {
                 'error': True,
                 'error_message': 'Captchas Detected',
+                'blocked': True,
             }
 
         return error
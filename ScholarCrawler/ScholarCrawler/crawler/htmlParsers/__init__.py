@@ -0,0 +1,3 @@
+"""
+Classes to parse the downloaded HTML sources
+"""
@@ -0,0 +1,32 @@
+"""
+Factory for the different HTML parser backends.
+"""
+
+
+def create_html_parser(name):
+    """
+    Creates an HTML parser backend from its name. The BeautifulSoup backends ('html5lib', 'lxml' and
+    'html.parser') return BeautifulSoup documents, the 'selectolax' backend wraps the selectolax nodes
+    so the versioned extractors can use the same select/get_text/attrs interface.
+    """
+    if name in ('html5lib', 'lxml', 'html.parser'):
+        from .parserSoup import ParserSoup
+        return ParserSoup(name)
+
+    if name == 'selectolax':
+        from .parserSelectolax import ParserSelectolax
+        return ParserSelectolax()
+
+    raise ValueError('Unknown HTML parser.')
+
+
+class HtmlParser(object):
+    name = None
+
+    # Parse the HTML source and return the document node
+    def parse(self, source):
+        pass
+
+    # Check if the source is an already parsed node of this backend
+    def is_node(self, source):
+        pass
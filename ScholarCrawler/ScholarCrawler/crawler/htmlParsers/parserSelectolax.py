@@ -0,0 +1,60 @@
+"""
+HTML Parser using the selectolax C-based CSS selector engine
+"""
+
+from .factory import HtmlParser
+
+
+class ParserSelectolax(HtmlParser):
+    name = 'selectolax'
+
+    def __init__(self):
+        try:
+            from selectolax.lexbor import LexborHTMLParser as SelectolaxHTMLParser
+        except ImportError:
+            from selectolax.parser import HTMLParser as SelectolaxHTMLParser
+
+        self.parser_class = SelectolaxHTMLParser
+
+    # Parse the HTML source and return the root node
+    def parse(self, source):
+        return SelectolaxNode(self.parser_class(source).root)
+
+    # Check if the source is a selectolax node
+    def is_node(self, source):
+        return isinstance(source, SelectolaxNode)
+
+
+class SelectolaxNode(object):
+    # Wrapper with the subset of the BeautifulSoup Tag interface used by the extractors
+    def __init__(self, node):
+        self.node = node
+        self._attrs = None
+
+    # Find the descendant nodes that match the CSS selector
+    def select(self, selector):
+        return [SelectolaxNode(node) for node in self.node.css(selector)]
+
+    # Get all the text of the node and its descendants
+    def get_text(self):
+        return self.node.text(deep=True)
+
+    # Get the node attributes (the class attribute is split into a list like in BeautifulSoup)
+    @property
+    def attrs(self):
+        if self._attrs is None:
+            self._attrs = {}
+            for key, value in self.node.attributes.items():
+                value = value if value is not None else ''
+                self._attrs[key] = value.split() if key == 'class' else value
+
+        return self._attrs
+
+    def get(self, key, default=None):
+        return self.attrs.get(key, default)
+
+    def __getitem__(self, key):
+        return self.attrs[key]
+
+    def __str__(self):
+        return self.node.html
@@ -0,0 +1,21 @@
+"""
+HTML Parser using BeautifulSoup with the desired tree builder (html5lib, lxml or html.parser)
+"""
+
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+
+from .factory import HtmlParser
+
+
+class ParserSoup(HtmlParser):
+    def __init__(self, tree_builder='html5lib'):
+        self.name = tree_builder
+
+    # Parse the HTML source and return the BeautifulSoup document
+    def parse(self, source):
+        return BeautifulSoup(source, self.name)
+
+    # Check if the source is a BeautifulSoup node
+    def is_node(self, source):
+        return isinstance(source, Tag)
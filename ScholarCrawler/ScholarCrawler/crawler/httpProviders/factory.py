@@ -0,0 +1,39 @@
+"""
+Factory for the different HTTP providers (direct connection and proxies).
+"""
+
+
+def create_http_provider(name, settings):
+    """
+    Creates an HTTP provider from its name and settings. Every provider exposes one or more endpoints
+    (exit points), see each provider for details on the settings it uses.
+    """
+    if name == 'direct':
+        from .proxyDirect import ProxyDirect
+        return ProxyDirect()
+
+    if name == 'static':
+        from .proxyStatic import ProxyStatic
+        return ProxyStatic(settings['static_proxies'])
+
+    if name == 'tor':
+        from .proxyTorManager import get_tor_manager
+        return get_tor_manager()
+
+    raise ValueError('Unknown HTTP provider.')
+
+
+class HttpProvider(object):
+    name = None
+
+    # Returns the ids of the endpoints of the provider
+    def get_endpoints(self):
+        pass
+
+    # Sets the data to establish a connection through the endpoint (None if the endpoint isn't available)
+    def set_connection(self, endpoint_id):
+        pass
+
+    # Standard function to change the Exit IP of the endpoint
+    def rotate_ip(self, endpoint_id):
+        pass
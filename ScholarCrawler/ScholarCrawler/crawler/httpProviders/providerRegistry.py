@@ -0,0 +1,144 @@
+"""
+Registry of the HTTP provider endpoints with health scoring and weighted selection
+"""
+
+import random
+import threading
+
+registry_lock = threading.Lock()
+provider_registry = None
+
+
+# Get the provider registry of the process (created from the HTTP_PROVIDERS_SETTINGS on the first call)
+def get_provider_registry():
+    global provider_registry
+    from ScholarCrawler import app
+
+    with registry_lock:
+        if provider_registry is None:
+            provider_registry = ProviderRegistry(app.config['HTTP_PROVIDERS_SETTINGS'])
+
+    return provider_registry
+
+
+class ProviderRegistry(object):
+    def __init__(self, settings):
+        from .factory import create_http_provider
+
+        self.latencyDecay = settings['latency_decay']
+        self.minWeight = settings['min_weight']
+        self.lock = threading.Lock()
+        self.providers = {}
+        self.endpoints = {}
+
+        # Register every endpoint of the enabled providers
+        for name in settings['providers']:
+            provider = create_http_provider(name, settings)
+            self.providers[name] = provider
+
+            for endpoint_id in provider.get_endpoints():
+                self.endpoints[name + ':' + str(endpoint_id)] = {
+                    'provider': name,
+                    'id': endpoint_id,
+                    'requests': 0,
+                    'successes': 0,
+                    'blocks': 0,
+                    'latency': None,
+                    'rotations': 0,
+                }
+
+    # Health score of an endpoint: success rate, penalized by the captcha/block rate and the average latency
+    def get_score(self, endpoint):
+        # The +1/+2 smoothing gives the new endpoints a neutral score
+        success_rate = (endpoint['successes'] + 1.0) / (endpoint['requests'] + 2.0)
+        block_rate = endpoint['blocks'] / (endpoint['requests'] + 2.0)
+        latency = endpoint['latency'] if endpoint['latency'] is not None else 1.0
+
+        return max(self.minWeight, success_rate * (1.0 - block_rate) ** 2 / (1.0 + latency))
+
+    # Choose an endpoint (weighted by the health score) and return its key and connection data. The excluded
+    # endpoints (e.g. one that just failed) are only chosen if no other endpoint is available
+    def get_connection(self, exclude=None):
+        if exclude:
+            key, proxy = self.get_connection_from([key for key in self.endpoints if key not in exclude])
+            return (key, proxy) if key is not None else self.get_connection_from(list(exclude))
+
+        return self.get_connection_from(list(self.endpoints))
+
+    # Choose one of the endpoints of the list (weighted by the health score)
+    def get_connection_from(self, keys):
+        with self.lock:
+            keys = [key for key in keys if key in self.endpoints]
+            weights = [self.get_score(self.endpoints[key]) for key in keys]
+
+        # Try the endpoints by weight until one is available
+        while keys:
+            key = random.choices(keys, weights)[0]
+            proxy = self.set_connection(key)
+
+            if proxy is not None:
+                return key, proxy
+
+            index = keys.index(key)
+            del keys[index]
+            del weights[index]
+
+        return None, None
+
+    # Data to establish a connection through a known endpoint (None if it isn't available)
+    def set_connection(self, key):
+        if key not in self.endpoints:
+            return None
+
+        endpoint = self.endpoints[key]
+        return self.providers[endpoint['provider']].set_connection(endpoint['id'])
+
+    # Update the endpoint statistics with the result of a request
+    def set_result(self, key, success, blocked=False, latency=None):
+        with self.lock:
+            if key not in self.endpoints:
+                return
+
+            endpoint = self.endpoints[key]
+            endpoint['requests'] += 1
+            endpoint['successes'] += 1 if success else 0
+            endpoint['blocks'] += 1 if blocked else 0
+
+            # Exponential moving average of the latency
+            if latency is not None:
+                endpoint['latency'] = latency if endpoint['latency'] is None else \
+                    (1 - self.latencyDecay) * endpoint['latency'] + self.latencyDecay * latency
+
+    # Change the exit IP of the endpoint (if the provider can do it)
+    def rotate_ip(self, key):
+        if key not in self.endpoints:
+            return None
+
+        endpoint = self.endpoints[key]
+        result = self.providers[endpoint['provider']].rotate_ip(endpoint['id'])
+
+        if result is not None:
+            with self.lock:
+                endpoint['rotations'] += 1
+
+        return result
+
+    # Identity of the current exit IP of the endpoint (without the credentials of its proxy URL)
+    def get_identity(self, key):
+        if key not in self.endpoints or not self.endpoints[key]['rotations']:
+            return key
+
+        return key + '#' + str(self.endpoints[key]['rotations'])
+
+    # Return the statistics and score of every endpoint
+    def get_status(self):
+        with self.lock:
+            return {
+                key: {
+                    'requests': endpoint['requests'],
+                    'successes': endpoint['successes'],
+                    'blocks': endpoint['blocks'],
+                    'latency': round(endpoint['latency'], 3) if endpoint['latency'] is not None else None,
+                    'score': round(self.get_score(endpoint), 4),
+                } for key, endpoint in self.endpoints.items()
+            }
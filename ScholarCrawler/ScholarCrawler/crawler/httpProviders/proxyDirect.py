@@ -0,0 +1,19 @@
+"""
+HTTP Provider for the direct connections (without proxy)
+"""
+
+from .factory import HttpProvider
+
+
+class ProxyDirect(HttpProvider):
+    name = 'direct'
+
+    def get_endpoints(self):
+        return [0]
+
+    # An empty proxies dict makes the requests without proxy
+    def set_connection(self, endpoint_id):
+        return {}
+
+    def rotate_ip(self, endpoint_id):
+        return None
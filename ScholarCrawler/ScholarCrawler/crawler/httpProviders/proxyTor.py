@@ -10,8 +10,8 @@ class ProxyTor(object):
     def __init__(self, params=None):
         from ScholarCrawler import app
 
-        # Get the default control values
-        self.defaults = app.config['TOR_SETTINGS']
+        # Get the default control values (a copy, the shared application config must not be modified)
+        self.defaults = dict(app.config['TOR_SETTINGS'])
 
         # Override default values with the ones specified in the params
         self.defaults['protocol'] = params['protocol'] if params is not None and 'protocol' in params else \
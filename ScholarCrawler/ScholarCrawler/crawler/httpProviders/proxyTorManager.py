@@ -0,0 +1,122 @@
+"""
+Long-lived manager of the Tor proxy circuits shared by all the crawlers
+"""
+
+import threading
+import time
+import uuid
+
+from .factory import HttpProvider
+
+manager_lock = threading.Lock()
+tor_manager = None
+
+
+# Get the Tor manager of the process (created from the TOR_SETTINGS on the first call)
+def get_tor_manager():
+    global tor_manager
+    from ScholarCrawler import app
+
+    with manager_lock:
+        if tor_manager is None:
+            tor_manager = ProxyTorManager(app.config['TOR_SETTINGS'])
+
+    return tor_manager
+
+
+class ProxyTorManager(HttpProvider):
+    name = 'tor'
+
+    def __init__(self, settings):
+        # Copy the settings, the shared application config must not be modified
+        self.settings = dict(settings)
+        self.lock = threading.Lock()
+        self.proxy = None
+        self.healthy = None
+        self.healthChecked = 0.0
+        self.probing = False
+
+        # Every circuit is a SocksPort plus a SOCKS username. Tor isolates the streams by SOCKS auth
+        # (IsolateSOCKSAuth is enabled by default), so every username gets its own circuit and exit IP
+        self.circuits = []
+        for port in self.settings['socks_ports']:
+            for _ in range(self.settings['circuits_per_port']):
+                self.circuits.append({
+                    'id': len(self.circuits),
+                    'port': port,
+                    'username': uuid.uuid4().hex,
+                    'rotations': 0,
+                })
+
+    # Get the control port connection (opened and authenticated only once)
+    def get_controller(self):
+        from .proxyTor import ProxyTor
+
+        if self.proxy is None or self.proxy.controller is None:
+            self.proxy = ProxyTor()
+
+        return self.proxy
+
+    # Check the Tor bootstrap status (cached during 'health_ttl' seconds). The control port is queried without the
+    # lock, and while a check is running the other threads get the last result
+    def check_status(self):
+        with self.lock:
+            if self.healthy is not None and (time.time() - self.healthChecked <= self.settings['health_ttl'] or
+                                             self.probing):
+                return self.healthy
+
+            self.probing = True
+
+        try:
+            healthy = bool(self.get_controller().check_tor_status())
+        except Exception as error:
+            print('Tor status check failed: ' + str(error))
+            self.proxy = None
+            healthy = False
+
+        with self.lock:
+            self.healthy = healthy
+            self.healthChecked = time.time()
+            self.probing = False
+
+        return healthy
+
+    # The endpoints of the Tor provider are its circuits
+    def get_endpoints(self):
+        return [circuit['id'] for circuit in self.circuits]
+
+    # Sets the data to establish a connection through a circuit (None if Tor isn't ready)
+    def set_connection(self, circuit_id):
+        if not self.check_status():
+            return None
+
+        circuit = self.circuits[circuit_id]
+        url = self.settings['protocol'] + '://' + circuit['username'] + ':tor@' + self.settings['ip'] + ':' + \
+            str(circuit['port']) + '/'
+
+        return {
+            'http': url,
+            'https': url,
+        }
+
+    # Change the exit IP of one circuit (a new SOCKS username builds a new circuit, the other ones keep working)
+    def rotate_circuit(self, circuit_id):
+        with self.lock:
+            circuit = self.circuits[circuit_id]
+            circuit['username'] = uuid.uuid4().hex
+            circuit['rotations'] += 1
+
+        return circuit_id
+
+    # Standard function to change the Proxy Exit IP
+    def rotate_ip(self, endpoint_id):
+        return self.rotate_circuit(endpoint_id)
+
+    # Return the circuits rotations and the cached health
+    def get_status(self):
+        with self.lock:
+            return {
+                'healthy': self.healthy,
+                'circuits': [{'id': circuit['id'], 'port': circuit['port'], 'rotations': circuit['rotations']}
+                             for circuit in self.circuits],
+            }
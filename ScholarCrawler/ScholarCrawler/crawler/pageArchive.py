@@ -0,0 +1,165 @@
+"""
+Append-only archive of the downloaded pages (one gzip member per page plus a JSON lines offset index)
+"""
+
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+
+writer_lock = threading.Lock()
+archive_writer = None
+
+
+# Get the archive writer of the process (its thread is started on the first call)
+def get_archive_writer():
+    global archive_writer
+
+    with writer_lock:
+        if archive_writer is None:
+            from ScholarCrawler import app
+            archive_writer = ArchiveWriter(app.config['PAGE_STORAGE_SETTINGS'])
+
+    return archive_writer
+
+
+def create_page_sink(settings, crawler_id, user_id):
+    """
+    Creates the destination of the pages of a crawl. The 'archive' backend writes one archive per crawl
+    in storage/extraction, the 'store' backend deduplicates the pages of all the crawls (see pageStore).
+    """
+    import datetime
+
+    if settings['backend'] == 'archive':
+        return PageArchive(os.path.join(settings['archive_path'], crawler_id + '-' + user_id + '-' +
+                                        str(datetime.datetime.now())))
+
+    if settings['backend'] == 'store':
+        from .pageStore import PageStore, StoredCrawl
+        return StoredCrawl(PageStore(settings['store_path']), user_id, crawler_id)
+
+    raise ValueError('Unknown page storage backend.')
+
+
+class ArchiveWriter(object):
+    """
+    Background thread that compresses and appends the pages of all the open archives, so the crawlers
+    never wait for the disk (only when the queue is full).
+    """
+    def __init__(self, settings):
+        self.compressLevel = settings['compress_level']
+        self.queue = queue.Queue(settings['queue_size'])
+        self.thread = threading.Thread(target=self.run, name='page-archive-writer', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            archive, name, content, done = self.queue.get()
+
+            try:
+                if done is not None:
+                    archive.close_files()
+                    done.set()
+                else:
+                    archive.write_page(name, content, self.compressLevel)
+            except Exception as error:
+                print('Page archive error (' + archive.path + '): ' + str(error))
+                if done is not None:
+                    done.set()
+
+    def add(self, archive, name, content, done=None):
+        self.queue.put((archive, name, content, done))
+
+
+class PageSink(object):
+    """
+    Destination of the pages downloaded by a crawl. The pages are queued to the archive writer,
+    which calls write_page and close_files in its thread.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.closed = False
+        self.pages = 0
+
+    # Queue a page to be written by the archive writer
+    def add_page(self, name, content):
+        if self.closed:
+            raise ValueError('The page archive is closed.')
+
+        get_archive_writer().add(self, name, content)
+        self.pages += 1
+
+    # Write the pending pages and close the archive files (waiting for the writer unless wait is False)
+    def close(self, wait=True):
+        if self.closed:
+            return
+
+        self.closed = True
+
+        # Nothing to wait for (the writer thread may not even exist)
+        if self.pages == 0:
+            return
+
+        done = threading.Event()
+        get_archive_writer().add(self, None, None, done)
+        if wait:
+            done.wait()
+
+    # Override this method to write a page (runs in the writer thread)
+    def write_page(self, name, content, compress_level):
+        pass
+
+    # Override this method to release the files of the sink (runs in the writer thread)
+    def close_files(self):
+        pass
+
+
+class PageArchive(PageSink):
+    pages_extension = '.pages.gz'
+    index_extension = '.index.jsonl'
+
+    def __init__(self, path):
+        # Path of the archive without extension, the pages and the index are stored in two files
+        super().__init__(path)
+        self.pagesFile = None
+        self.indexFile = None
+        self.offset = 0
+
+    # Compress and append a page (runs in the writer thread)
+    def write_page(self, name, content, compress_level):
+        if self.pagesFile is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.pagesFile = open(self.path + self.pages_extension, 'ab')
+            self.indexFile = open(self.path + self.index_extension, 'a')
+            self.offset = self.pagesFile.tell()
+
+        # Every page is a complete gzip member, so it can be read alone and the file is still a valid gzip
+        data = gzip.compress(content, compress_level)
+        self.pagesFile.write(data)
+        self.indexFile.write(json.dumps({'name': name, 'offset': self.offset, 'length': len(data),
+                                         'size': len(content), 'date': time.time()}) + '\n')
+        self.offset += len(data)
+
+    # Flush and close the files (runs in the writer thread)
+    def close_files(self):
+        if self.pagesFile is not None:
+            self.pagesFile.close()
+            self.indexFile.close()
+            self.pagesFile = None
+            self.indexFile = None
+
+    # Return the index entries of an archive
+    @classmethod
+    def read_index(cls, path):
+        with open(path + cls.index_extension) as file:
+            return [json.loads(line) for line in file if line.strip()]
+
+    # Iterate over the pages of an archive as (name, content) tuples
+    @classmethod
+    def read_pages(cls, path):
+        with open(path + cls.pages_extension, 'rb') as file:
+            for entry in cls.read_index(path):
+                file.seek(entry['offset'])
+                yield entry['name'], gzip.decompress(file.read(entry['length']))
@@ -0,0 +1,280 @@
+"""
+Content-addressed store of the downloaded pages (deduplicated by SHA-256) with a fixed-width binary index
+"""
+
+import gzip
+import hashlib
+import mmap
+import os
+import re
+import struct
+import time
+from contextlib import contextmanager
+
+from .pageArchive import PageSink
+
+try:
+    import fcntl
+except ImportError:  # Windows, the index isn't locked between processes
+    fcntl = None
+
+
+class PageStore(object):
+    """
+    The pages are stored once in blobs/<2 first hex chars>/<sha256>.gz, and every download adds a record
+    to index.v2.bin: user, crawler, crawl (start timestamp in microseconds), date, page number, name, digest,
+    size and a deleted flag. The records have a fixed width, so the index is searched through a memory map
+    without parsing it (the user and crawl filters are found with mmap.find, see iter_matching_records).
+    """
+    record = struct.Struct('<24s24sqdH96s32sIB')
+    crawl_offset = 48
+    deleted_offset = record.size - 1
+
+    # Records of the first index version (index.bin), with the crawl as a float timestamp
+    record_v1 = struct.Struct('<24s24sddH96s32sIB')
+
+    def __init__(self, path):
+        self.path = path
+        self.indexPath = os.path.join(path, 'index.v2.bin')
+        self.lockPath = os.path.join(path, 'index.lock')
+        os.makedirs(os.path.join(path, 'blobs'), exist_ok=True)
+
+        if os.path.exists(os.path.join(path, 'index.bin')):
+            self.upgrade_index()
+
+    # Convert the first version of the index (index.bin) to the current one (the crawl in microseconds)
+    def upgrade_index(self):
+        old_path = os.path.join(self.path, 'index.bin')
+
+        with self.lock(exclusive=True):
+            if not os.path.exists(old_path):
+                return
+
+            temp_path = self.indexPath + '.tmp'
+            with open(old_path, 'rb') as old_file, open(temp_path, 'wb') as file:
+                for fields in self.record_v1.iter_unpack(old_file.read()[:os.path.getsize(old_path) //
+                                                                          self.record_v1.size * self.record_v1.size]):
+                    file.write(self.record.pack(fields[0], fields[1], get_crawl_id(fields[2]), *fields[3:]))
+
+                # The records already in the new index (if any) are kept after the old ones
+                if os.path.exists(self.indexPath):
+                    with open(self.indexPath, 'rb') as new_file:
+                        file.write(new_file.read())
+
+            os.replace(temp_path, self.indexPath)
+            os.remove(old_path)
+
+    # Lock the index between processes (shared to add pages, exclusive to rewrite the index)
+    @contextmanager
+    def lock(self, exclusive=False):
+        with open(self.lockPath, 'a') as file:
+            if fcntl is not None:
+                fcntl.flock(file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(file, fcntl.LOCK_UN)
+
+    def get_blob_path(self, digest):
+        return os.path.join(self.path, 'blobs', digest[:2], digest + '.gz')
+
+    # Store the page content (only if it's a new one) and add its record to the index
+    def add_page(self, user_id, crawler_id, crawl, name, content, page=0, compress_level=6):
+        digest = hashlib.sha256(content).hexdigest()
+        blob_path = self.get_blob_path(digest)
+
+        with self.lock():
+            if not os.path.exists(blob_path):
+                # Write to a temp file and rename it, so the readers never see a partial blob
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                temp_path = blob_path + '.' + str(os.getpid()) + '.tmp'
+                with open(temp_path, 'wb') as file:
+                    file.write(gzip.compress(content, compress_level))
+                os.replace(temp_path, blob_path)
+
+            # The index is opened for every record because the compaction replaces the file
+            with open(self.indexPath, 'ab') as file:
+                file.write(self.record.pack(user_id.encode()[:24], crawler_id.encode()[:24], crawl, time.time(),
+                                            page, name.encode()[:96], bytes.fromhex(digest), len(content), 0))
+
+        return digest
+
+    # Read the content of a page from its digest
+    def read_page(self, digest):
+        with open(self.get_blob_path(digest), 'rb') as file:
+            return gzip.decompress(file.read())
+
+    # Iterate over the index records that have the key bytes at the offset of the record. The memory map is searched
+    # with mmap.find, so only the records that match are unpacked (position, fields)
+    def iter_matching_records(self, key, offset):
+        if not os.path.exists(self.indexPath) or os.path.getsize(self.indexPath) < self.record.size:
+            return
+
+        with open(self.indexPath, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                # Ignore a partial record at the end (a write in progress)
+                end = len(data) // self.record.size * self.record.size
+                start = offset
+
+                while True:
+                    found = data.find(key, start, end)
+                    if found < 0:
+                        return
+
+                    # The key can also be found in other fields of the records
+                    position, remainder = divmod(found - offset, self.record.size)
+                    if remainder:
+                        start = found + 1
+                        continue
+
+                    yield data, position, self.record.unpack_from(data, position * self.record.size)
+                    start = found + self.record.size
+
+    # Iterate over the raw index records through a memory map (position, fields)
+    def iter_records(self, writable=False):
+        if not os.path.exists(self.indexPath) or os.path.getsize(self.indexPath) < self.record.size:
+            return
+
+        with open(self.indexPath, 'r+b' if writable else 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ) as data:
+                # Ignore a partial record at the end (a write in progress)
+                count = len(data) // self.record.size
+                for position in range(count):
+                    yield data, position, self.record.unpack_from(data, position * self.record.size)
+
+    def get_entry(self, position, fields):
+        return {
+            'position': position,
+            'user': fields[0].rstrip(b'\0').decode(),
+            'crawler': fields[1].rstrip(b'\0').decode(),
+            'crawl': fields[2],
+            'date': fields[3],
+            'page': fields[4],
+            'name': fields[5].rstrip(b'\0').decode(),
+            'digest': fields[6].hex(),
+            'size': fields[7],
+            'deleted': bool(fields[8]),
+        }
+
+    # Find the pages by user, crawl (start timestamp in microseconds), page number and date range
+    def find(self, user_id=None, crawl=None, page=None, since=None, until=None, include_deleted=False):
+        user = user_id.encode()[:24].ljust(24, b'\0') if user_id is not None else None
+        entries = []
+
+        # The crawl (or the user) is searched in the memory map, the other filters check the found records
+        if crawl is not None:
+            records = self.iter_matching_records(struct.pack('<q', crawl), self.crawl_offset)
+        elif user is not None:
+            records = self.iter_matching_records(user, 0)
+        else:
+            records = self.iter_records()
+
+        for _, position, fields in records:
+            if user is not None and fields[0] != user:
+                continue
+            if crawl is not None and fields[2] != crawl:
+                continue
+            if page is not None and fields[4] != page:
+                continue
+            if since is not None and fields[3] < since:
+                continue
+            if until is not None and fields[3] >= until:
+                continue
+            if fields[8] and not include_deleted:
+                continue
+
+            entries.append(self.get_entry(position, fields))
+
+        return entries
+
+    # Mark as deleted the records older than the retention days (the blobs are removed by compact)
+    def prune(self, days):
+        limit = time.time() - days * 86400
+        pruned = 0
+
+        with self.lock(exclusive=True):
+            for data, position, fields in self.iter_records(writable=True):
+                if not fields[8] and fields[3] < limit:
+                    data[position * self.record.size + self.deleted_offset] = 1
+                    pruned += 1
+
+        return pruned
+
+    # Rewrite the index without the deleted records and remove the blobs that aren't used anymore
+    def compact(self):
+        removed_records = 0
+        removed_blobs = 0
+        used = set()
+
+        with self.lock(exclusive=True):
+            temp_path = self.indexPath + '.tmp'
+            with open(temp_path, 'wb') as file:
+                for _, position, fields in self.iter_records():
+                    if fields[8]:
+                        removed_records += 1
+                        continue
+
+                    used.add(fields[6].hex())
+                    file.write(self.record.pack(*fields))
+
+            os.replace(temp_path, self.indexPath)
+
+            for directory, _, files in os.walk(os.path.join(self.path, 'blobs')):
+                for name in files:
+                    if name.endswith('.gz') and name[:-3] not in used:
+                        os.remove(os.path.join(directory, name))
+                        removed_blobs += 1
+
+        return {
+            'removed_records': removed_records,
+            'removed_blobs': removed_blobs,
+        }
+
+    # Return the number of records and blobs and the bytes saved by the deduplication
+    def get_status(self):
+        records = 0
+        deleted = 0
+        pages_size = 0
+        digests = set()
+
+        for _, position, fields in self.iter_records():
+            records += 1
+            deleted += fields[8]
+            pages_size += fields[7]
+            digests.add(fields[6].hex())
+
+        blobs_size = sum(os.path.getsize(self.get_blob_path(digest)) for digest in digests
+                         if os.path.exists(self.get_blob_path(digest)))
+
+        return {
+            'records': records,
+            'deleted': deleted,
+            'blobs': len(digests),
+            'pages_size': pages_size,
+            'blobs_size': blobs_size,
+        }
+
+
+# Id of a crawl: its start timestamp in microseconds
+def get_crawl_id(timestamp):
+    return int(round(timestamp * 1000000))
+
+
+class StoredCrawl(PageSink):
+    """
+    Page sink of a crawl that writes to the page store (the pages are written by the archive writer thread)
+    """
+    regexPage = re.compile(r'-page-(\d+)-')
+
+    def __init__(self, store, user_id, crawler_id):
+        super().__init__(store.path)
+        self.store = store
+        self.userId = user_id
+        self.crawlerId = crawler_id
+        self.crawl = get_crawl_id(time.time())
+
+    def write_page(self, name, content, compress_level):
+        page = self.regexPage.search(name)
+        self.store.add_page(self.userId, self.crawlerId, self.crawl, name, content,
+                            int(page.group(1)) if page is not None else 0, compress_level)
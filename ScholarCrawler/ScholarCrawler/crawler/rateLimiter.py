@@ -0,0 +1,127 @@
+"""
+Token bucket rate limiter shared by all the crawlers, keyed by domain and proxy identity
+"""
+
+import os
+import threading
+import time
+
+limiter_lock = threading.Lock()
+rate_limiter = None
+
+
+# Get the rate limiter of the process (created from the RATE_LIMIT_SETTINGS on the first call)
+def get_rate_limiter():
+    global rate_limiter
+    from ScholarCrawler import app
+
+    with limiter_lock:
+        if rate_limiter is None:
+            rate_limiter = create_rate_limiter(app.config['RATE_LIMIT_SETTINGS'])
+
+    return rate_limiter
+
+
+def create_rate_limiter(settings):
+    """
+    Creates a rate limiter from its settings. The 'memory' backend limits the requests of one process,
+    the 'sqlite' backend stores the buckets in a local file, so all the processes of the host share them.
+    """
+    if settings['backend'] == 'memory':
+        return MemoryRateLimiter(settings)
+
+    if settings['backend'] == 'sqlite':
+        return SqliteRateLimiter(settings)
+
+    raise ValueError('Unknown rate limiter backend.')
+
+
+class RateLimiter(object):
+    def __init__(self, settings):
+        self.rate = float(settings['requests_per_second'])
+        self.burst = float(settings['burst'])
+        self.minInterval = float(settings['min_interval'])
+
+    # Reserve a request slot for the key and return the seconds to wait before making the request
+    def reserve(self, key):
+        pass
+
+    # Wait until the reserved request slot of the key
+    def wait(self, key):
+        delay = self.reserve(key)
+        if delay > 0:
+            time.sleep(delay)
+
+        return delay
+
+    # Take a token from the bucket state (tokens, updated, last) and return the new state and the wait time
+    def take_token(self, tokens, updated, last, now):
+        # Refill the bucket with the elapsed time (negative tokens are slots already reserved in the future)
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        slot = now if tokens >= 1 else now + (1 - tokens) / self.rate
+        tokens -= 1
+
+        # Keep the minimum gap between two requests of the same key
+        slot = max(slot, last + self.minInterval)
+
+        return tokens, now, slot, slot - now
+
+
+class MemoryRateLimiter(RateLimiter):
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def reserve(self, key):
+        now = time.time()
+
+        with self.lock:
+            tokens, updated, last = self.buckets.get(key, (self.burst, now, 0.0))
+            tokens, updated, last, delay = self.take_token(tokens, updated, last, now)
+            self.buckets[key] = (tokens, updated, last)
+
+        return delay
+
+
+class SqliteRateLimiter(RateLimiter):
+    def __init__(self, settings):
+        super().__init__(settings)
+
+        self.path = settings['path'] if settings.get('path') else \
+            os.path.join(os.path.dirname(__file__), 'storage/rateLimiter.sqlite')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        # sqlite connections can't be shared between threads
+        self.local = threading.local()
+
+        self.get_connection().execute('CREATE TABLE IF NOT EXISTS buckets '
+                                      '(key TEXT PRIMARY KEY, tokens REAL, updated REAL, last REAL)')
+
+    def get_connection(self):
+        import sqlite3
+
+        if not hasattr(self.local, 'connection'):
+            self.local.connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+        return self.local.connection
+
+    def reserve(self, key):
+        connection = self.get_connection()
+
+        # The immediate transaction locks the database, so the bucket is updated by one process at a time
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            row = connection.execute('SELECT tokens, updated, last FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens, updated, last = row if row is not None else (self.burst, now, 0.0)
+
+            tokens, updated, last, delay = self.take_token(tokens, updated, last, now)
+            connection.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated, last) VALUES (?, ?, ?, ?)',
+                               (key, tokens, updated, last))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+        return delay
@@ -0,0 +1,210 @@
+"""
+Offline replay of the downloaded pages: the archived pages are processed again (in a process pool)
+and the articles are stored in the repository in batches, without making any request
+"""
+
+import os
+import re
+import time
+import zipfile
+from collections import deque
+
+# Crawlers of the worker process (one per user, created on its first page)
+replay_crawlers = {}
+
+
+# Process a page in a worker process and return the user id and the page data
+def process_replay_page(desired_crawler, user_data, content):
+    from .crawlerGeneral import create_crawler
+
+    if user_data['id'] not in replay_crawlers:
+        replay_crawlers[user_data['id']] = create_crawler(user_data, desired_crawler, {'page_storage': False})
+
+    return user_data['id'], replay_crawlers[user_data['id']].process_page(content)
+
+
+class ReplayEngine(object):
+    # Only the articles pages downloaded without errors are replayed (not the retries or the error pages). The
+    # name ends with the download timestamp
+    regexPage = re.compile(r'^articles-(?P<user>[0-9a-fA-F]+)-page-(?P<page>\d+)-(?P<timestamp>\d+(\.\d+)?)?')
+
+    def __init__(self, desired_crawler='googleScholarArticles', workers=None, batch_size=500):
+        from models.factory import connect_to_database
+        from ScholarCrawler import app
+
+        self.desiredCrawler = desired_crawler
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.batchSize = batch_size
+        self.db = connect_to_database(app.config['REPOSITORY_NAME'], app.config['REPOSITORY_SETTINGS'])
+        self.users = {}
+        self.batches = {}
+        self.stats = {
+            'pages': 0,
+            'skipped': 0,
+            'failed': 0,
+            'articles': 0,
+            'stale': 0,
+            'backfilled': 0,
+            'upserted': 0,
+            'modified': 0,
+            'unknown_aliases': 0,
+        }
+
+    # Iterate over the pages of the archives (.pages.gz), the legacy zip files and the directories with them
+    def iter_files(self, paths):
+        from .pageArchive import PageArchive
+
+        for path in paths:
+            if os.path.isdir(path):
+                files = [os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if name.endswith(PageArchive.pages_extension) or name.endswith('.zip')]
+                yield from self.iter_files(files)
+            elif path.endswith(PageArchive.pages_extension):
+                yield from PageArchive.read_pages(path[:-len(PageArchive.pages_extension)])
+            elif zipfile.is_zipfile(path):
+                with zipfile.ZipFile(path) as archive:
+                    for name in sorted(archive.namelist()):
+                        yield os.path.basename(name), archive.read(name)
+
+    # Iterate over the pages of the page store
+    @staticmethod
+    def iter_store(store, user_id=None, since=None):
+        for entry in store.find(user_id, since=since):
+            yield entry['name'], store.read_page(entry['digest'])
+
+    # Get the crawler user data from the repository (None if the user doesn't exist anymore)
+    def get_user_data(self, user_id):
+        if user_id not in self.users:
+            try:
+                doc = self.db.get_user_by_id(user_id)
+            except Exception:
+                doc = 'userNotFound'
+
+            self.users[user_id] = None if doc == 'userNotFound' else {
+                'id': user_id, 'user': doc['mail'], 'scholarUser': doc['scholarUser'],
+                'scholarAliases': doc['scholarAliases'],
+            }
+
+        return self.users[user_id]
+
+    # Process the pages in the worker processes and store their articles (the results are stored in order)
+    def run(self, pages, user_id=None):
+        from concurrent.futures import ProcessPoolExecutor
+        import multiprocessing
+
+        start = time.time()
+
+        # The forked workers reuse the loaded application (a spawned worker would start another scheduler)
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() \
+            else None
+        pending = deque()
+
+        with ProcessPoolExecutor(self.workers, mp_context=context) as executor:
+            for name, content in pages:
+                match = self.regexPage.match(name)
+                if match is None or (user_id is not None and match.group('user') != user_id):
+                    continue
+
+                user_data = self.get_user_data(match.group('user'))
+                if user_data is None:
+                    self.stats['skipped'] += 1
+                    continue
+
+                pending.append((self.get_page_date(match),
+                                executor.submit(process_replay_page, self.desiredCrawler, user_data, content)))
+
+                # Keep a limited number of pages in memory
+                if len(pending) >= self.workers * 4:
+                    self.add_result(*pending.popleft())
+
+            while pending:
+                self.add_result(*pending.popleft())
+
+        for batch_user in list(self.batches):
+            self.store_batch(batch_user)
+
+        self.stats['seconds'] = round(time.time() - start, 3)
+        return self.stats
+
+    # Download date of a page in the format of the repository dates (None if the name has no timestamp)
+    @staticmethod
+    def get_page_date(match):
+        import datetime
+
+        if match.group('timestamp') is None:
+            return None
+
+        return datetime.datetime.utcfromtimestamp(float(match.group('timestamp'))).strftime('%Y-%m-%d %H:%M:%S')
+
+    # Add the articles of a processed page to the batch of its user
+    def add_result(self, date, future):
+        try:
+            user_id, data = future.result()
+        except Exception as error:
+            print('Replay error: ' + str(error))
+            self.stats['failed'] += 1
+            return
+
+        self.stats['pages'] += 1
+        if data is None:
+            return
+
+        batch = self.batches.setdefault(user_id, {'articles': {}, 'dates': {}, 'unknown_aliases': set()})
+
+        # The newest page of an article replaces the older ones
+        for article in data['articles']:
+            if date is None or (batch['dates'].get(article['articleId']) or '') <= date:
+                batch['articles'][article['articleId']] = article
+                batch['dates'][article['articleId']] = date
+        batch['unknown_aliases'].update(data['unknown_aliases'])
+
+        if len(batch['articles']) >= self.batchSize:
+            self.store_batch(user_id)
+
+    # Write the batch of a user in the repository. An article is written if its page was downloaded during or
+    # after the crawl that wrote the stored article (its crawl date). The older pages (and the pages without date)
+    # only fill the fields that are missing in the stored article, so a replay doesn't roll back newer data
+    def store_batch(self, user_id):
+        batch = self.batches.pop(user_id)
+
+        stored = self.db.get_articles_by_ids(user_id, list(batch['articles'])) if batch['articles'] else None
+        stored = stored if stored is not None else {}
+
+        # The articles are written grouped by the date of their page, which is their new crawl date
+        pages = {}
+        backfill = []
+        for article_id, article in batch['articles'].items():
+            date = batch['dates'][article_id]
+            stored_article = stored.get(article_id)
+
+            if stored_article is None or (date is not None and date >= (stored_article.get('crawl_date') or
+                                                                        stored_article.get('update_date') or '')):
+                pages.setdefault(date, []).append(article)
+                continue
+
+            missing = {key: value for key, value in article.items()
+                       if value is not None and stored_article.get(key) is None}
+            if missing:
+                backfill.append(dict(stored_article, **missing))
+            else:
+                self.stats['stale'] += 1
+
+        for date, articles in pages.items():
+            self.add_counts(self.db.add_new_articles(user_id, articles, date))
+            self.stats['articles'] += len(articles)
+
+        if backfill:
+            self.add_counts(self.db.add_new_articles(user_id, backfill))
+            self.stats['backfilled'] += len(backfill)
+
+        if batch['unknown_aliases']:
+            self.db.add_new_unused_aliases(user_id, list(batch['unknown_aliases']))
+            self.stats['unknown_aliases'] += len(batch['unknown_aliases'])
+
+    # Add the write counts of the repository to the statistics
+    def add_counts(self, counts):
+        if counts is None:
+            return
+
+        self.stats['upserted'] += counts['upserted']
+        self.stats['modified'] += counts['modified']
@@ -0,0 +1,74 @@
+"""
+Resolver that remembers which extractor version matched for every field and domain
+"""
+
+import threading
+
+
+class VersionResolver(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.preferred = {}
+        self.functions = {}
+        self.stats = {}
+
+    # Get the field name from the version list (the function name without the version date)
+    @staticmethod
+    def get_field(version_list):
+        return version_list[0].rsplit('_', 1)[0] if version_list else ''
+
+    # Return the version list with the last matching version of the field (for the domain) in first place
+    def get_versions(self, domain, field, version_list):
+        preferred = self.preferred.get((domain, field))
+
+        if preferred is None or preferred == version_list[0] or preferred not in version_list:
+            return version_list
+
+        return [preferred] + [version for version in version_list if version != preferred]
+
+    # Get the extractor function of a class (looked up only once per class and version)
+    def get_function(self, crawler_class, version):
+        key = (crawler_class, version)
+        function = self.functions.get(key)
+
+        if function is None:
+            function = getattr(crawler_class, version)
+            self.functions[key] = function
+
+        return function
+
+    # Store the version that matched the field and update the hit/miss counters
+    def set_match(self, domain, field, version, attempts):
+        key = (domain, field)
+
+        with self.lock:
+            stats = self.stats.setdefault(key, {'hits': 0, 'misses': 0, 'failed': 0})
+
+            if version is None:
+                stats['failed'] += 1
+                return
+
+            # A hit is a match with the first tried version, a miss needed a fallback to another version
+            if attempts == 1:
+                stats['hits'] += 1
+            else:
+                stats['misses'] += 1
+
+            if self.preferred.get(key) != version:
+                self.preferred[key] = version
+
+    # Return the counters and the preferred versions of every field
+    def get_stats(self):
+        with self.lock:
+            return {
+                domain + ':' + field: {
+                    'version': self.preferred.get((domain, field)),
+                    'hits': stats['hits'],
+                    'misses': stats['misses'],
+                    'failed': stats['failed'],
+                } for (domain, field), stats in self.stats.items()
+            }
+
+
+# Resolver shared by all the crawlers of the process
+version_resolver = VersionResolver()
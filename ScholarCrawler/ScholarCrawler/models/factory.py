@@ -57,18 +57,42 @@ class Database(object):
     def set_connection(self):
         pass
 
+    # Create the indexes used by the queries of the repository
+    def ensure_indexes(self):
+        pass
+
+    # Return the missing and unused indexes of the repository
+    def get_index_report(self):
+        pass
+
+    # Copy the articles of the old per user collections into the articles collection
+    def migrate_user_collections(self, batch_size=1000, drop=False):
+        pass
+
     # Returns all the users from the database
     def get_all_users(self):
         pass
 
-    # Returns all the articles related to an user from the user collection
-    def get_articles(self, user_id):
+    # Returns a page of the articles of an user (the cursor continues with the next page)
+    def get_articles(self, user_id, location=None, sort='date', limit=20, cursor=None, fields=None):
         pass
 
     # Returns all the articles related to an user from the others collection
     def get_articles_others(self, user_id):
         pass
 
+    # Iterate over the articles of an user in update order
+    def iter_articles(self, user_id, location=None, since=None, batch_size=500):
+        pass
+
+    # Returns the articles of an user created or updated after the cursor
+    def get_article_changes(self, user_id, cursor=None, limit=100, location=None, lag=2):
+        pass
+
+    # Returns the stored articles of an user with the desired ids (indexed by articleId)
+    def get_articles_by_ids(self, user_id, article_ids):
+        pass
+
     # Returns a user from the repository, using the mail
     def get_user_by_mail(self, user):
         pass
@@ -77,14 +101,35 @@ class Database(object):
     def add_new_user(self, user):
         pass
 
-    # Adds new articles to the user Collection
-    def add_new_articles(self, user_id, articles):
+    # Adds new articles to the user Collection (returns the matched, upserted and modified counts). The stored
+    # articles (indexed by articleId, as get_articles_by_ids returns them) avoid reading them again
+    def add_new_articles(self, user_id, articles, crawl_date=None, stored=None):
         pass
 
     # Adds new articles to the others user Collection
     def add_new_articles_others(self, user_id, articles):
         pass
 
+    # Updates the currently used user aliases and, if given, the unused ones (in a single update)
+    def update_user_aliases(self, user_id, aliases, unused_aliases=None):
+        pass
+
+    # Updates the currently unused user aliases
+    def update_unused_user_aliases(self, user_id, aliases):
+        pass
+
+    # Classify again the articles of the user with its aliases
+    def classify_user_articles(self, user_id, aliases=None):
+        pass
+
+    # Adds a new Scheduler Job ID to the user
+    def add_new_scheduler_job_id(self, user_id, scheduler_job_id):
+        pass
+
+    # Remove a Scheduler Job ID from the user
+    def remove_scheduler_job_id(self, user_id, scheduler_job_id):
+        pass
+
 
 class Scheduler(object):
     job_stores = None
@@ -110,8 +155,8 @@ class Scheduler(object):
             'coalesce': True,
             'max_instances': 1
         }
-        # Register the Scheduler
-        self.scheduler = BackgroundScheduler(jobstores=self.job_stores, executors=self.executors,
+        # Register the Scheduler (without job stores the jobs are kept in memory)
+        self.scheduler = BackgroundScheduler(jobstores=self.job_stores or {}, executors=self.executors,
                                              job_defaults=self.job_defaults, timezone=utc)
 
         # Start the Scheduler
@@ -0,0 +1,68 @@
+"""
+Process-wide registry of the MongoDB clients (one connection pool per host) and their cached health checks.
+"""
+
+import threading
+import time
+
+import pymongo
+
+registry_lock = threading.Lock()
+clients = {}
+probes = {}
+health = {}
+
+
+# Get the shared client of the host (pymongo clients are thread safe and keep their own connection pool)
+def get_mongo_client(host):
+    with registry_lock:
+        if host not in clients:
+            clients[host] = pymongo.MongoClient(host)
+
+        return clients[host]
+
+
+# Client used only by the health checks (it fails fast when the server isn't available)
+def get_probe_client(host, max_delay):
+    with registry_lock:
+        if host not in probes:
+            probes[host] = pymongo.MongoClient(host, serverSelectionTimeoutMS=max_delay)
+
+        return probes[host]
+
+
+def check_mongo_health(host, max_delay=100, ttl=30, failure_ttl=5):
+    """
+    Returns if the server of the host is available. The result is cached during 'ttl' seconds ('failure_ttl'
+    when the server isn't available), and while a check is running the other threads get the last result.
+    """
+    now = time.time()
+
+    with registry_lock:
+        state = health.setdefault(host, {'healthy': None, 'info': None, 'expires': 0.0, 'probing': False})
+        if state['healthy'] is not None and (now < state['expires'] or state['probing']):
+            return state['healthy']
+
+        state['probing'] = True
+
+    try:
+        info = get_probe_client(host, max_delay).server_info()
+        healthy = True
+    except pymongo.errors.PyMongoError as err:
+        print(err)
+        info = None
+        healthy = False
+
+    with registry_lock:
+        state['healthy'] = healthy
+        state['info'] = info
+        state['probing'] = False
+        state['expires'] = time.time() + (ttl if healthy else failure_ttl)
+
+    return healthy
+
+
+# Get the server info of the last health check of the host
+def get_mongo_info(host):
+    with registry_lock:
+        return health[host]['info'] if host in health else None
@@ -4,15 +4,83 @@ Repository that stores data in a MongoDB database.
 
 import pymongo
 
-from flask import json
 from bson.objectid import InvalidId
-from bson.json_util import dumps
 
 from .factory import *
+from .mongoClients import check_mongo_health, get_mongo_client, get_mongo_info
+
+
+# Check the server of the host with the health check TTLs of the repository settings
+def check_mongo_connection(host, settings, max_delay=100):
+    return check_mongo_health(host, max_delay, settings.get('MONGODB_HEALTH_TTL', 30),
+                              settings.get('MONGODB_FAILURE_TTL', 5))
+
+
+# Collections with their indexes already created by this process
+indexed_collections = set()
+
+# Users with their old articles collection already checked (and copied) by this process
+migrated_users = set()
+
+
+# Continuation token of a page of articles: the sort value and the id of its last article
+def encode_articles_cursor(sort, value, last_id):
+    import base64
+    import json
+
+    return base64.urlsafe_b64encode(json.dumps([sort, value, str(last_id)]).encode()).decode()
+
+
+# Get the sort value and the id of the last article from a continuation token (ValueError if it isn't valid)
+def decode_articles_cursor(cursor, sort):
+    import base64
+    import binascii
+    import json
+    from bson.objectid import ObjectId
+
+    try:
+        cursor_sort, value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        last_id = ObjectId(last_id)
+    except (binascii.Error, TypeError, UnicodeError, InvalidId, ValueError):
+        raise ValueError('Invalid cursor')
+
+    if cursor_sort != sort:
+        raise ValueError('The cursor was created with another sort')
+
+    return value, last_id
+
+
+# Location of an article in the articles page: 'user' when one of its authors is an alias of the user
+def get_article_location(authors, aliases):
+    return 'user' if authors and not set(aliases).isdisjoint(authors) else 'others'
 
 
 class Database(Database):
     # MongoDB database.
+
+    # Articles of all the users (DataStorage database), keyed by userId and articleId. The old
+    # 'articles_<userId>' collections are copied into it by migrate_user_collections
+    articles_collection = 'articles'
+
+    # Indexes of the users collection and of the articles collection (keys, options)
+    user_indexes = [
+        ([('mail', pymongo.ASCENDING)], {'unique': True}),
+    ]
+    # The articles pages sort by date (year strings of 4 digits) or quotes (integers), so the indexes and the
+    # queries use the default (binary) collation
+    article_indexes = [
+        ([('userId', pymongo.ASCENDING), ('articleId', pymongo.ASCENDING)], {'unique': True}),
+        ([('userId', pymongo.ASCENDING), ('location', pymongo.ASCENDING), ('date', pymongo.DESCENDING),
+          ('_id', pymongo.DESCENDING)], {}),
+        ([('userId', pymongo.ASCENDING), ('location', pymongo.ASCENDING), ('quotes', pymongo.DESCENDING),
+          ('_id', pymongo.DESCENDING)], {}),
+        ([('userId', pymongo.ASCENDING), ('update_date', pymongo.ASCENDING), ('_id', pymongo.ASCENDING)], {}),
+    ]
+
+    # Sorts (descending) and fields of the articles pages
+    article_sorts = ('date', 'quotes')
+    article_fields = ('articleId', 'title', 'date', 'source', 'description', 'quotes', 'versions', 'related',
+                      'authors', 'location', 'creation_date', 'update_date')
     def __init__(self, settings):
         """Initializes the repository with the specified settings dict.
         Required settings are:
@@ -27,7 +95,10 @@ class Database(Database):
             self.host = settings['MONGODB_HOST']
         else:
             self.host = 'localhost'
-        self.client = pymongo.MongoClient(self.host)
+        self.settings = settings
+
+        # Shared client of the process (see mongoClients)
+        self.client = get_mongo_client(self.host)
 
         if 'MONGODB_DATABASE' in settings:
             self.database = self.client[settings['MONGODB_DATABASE']]
@@ -39,20 +110,74 @@ class Database(Database):
         else:
             self.collection = self.database['Users']
 
-    # Check the connection to the desired database
+    # Check the connection to the desired database (cached health check)
     def check_connection(self, max_delay=100):
-        try:
-            client = pymongo.MongoClient(self.host, serverSelectionTimeoutMS=max_delay)
-            self.info = client.server_info()
-        except pymongo.errors.ServerSelectionTimeoutError as err:
-            print(err)
-            return False
-        return True
+        healthy = check_mongo_connection(self.host, self.settings, max_delay)
+        self.info = get_mongo_info(self.host)
+        return healthy
 
     # Establish the connection to the desired collection/table/database
     def set_connection(self):
         pass
 
+    # Create the missing indexes of the users and articles collections (creating an existing index does nothing)
+    def ensure_indexes(self):
+        self.create_indexes(self.client['ScholarSettings']['Users'], self.user_indexes)
+        self.create_indexes(self.client['DataStorage'][self.articles_collection], self.article_indexes)
+        indexed_collections.add(self.articles_collection)
+
+    def create_indexes(self, collection, indexes):
+        models = [pymongo.IndexModel(keys, **options) for keys, options in indexes]
+
+        try:
+            collection.create_indexes(models)
+        except pymongo.errors.OperationFailure as err:
+            # An index created by a previous version with other options (IndexOptionsConflict) is created again
+            if err.code in (85, 86) and self.drop_changed_indexes(collection, models):
+                self.create_indexes(collection, indexes)
+                return
+
+            # A unique index fails with duplicated values, the collection keeps working without it
+            print('Index creation failed for ' + collection.full_name + ': ' + str(err))
+
+    # Drop the indexes with the name of a desired index but other options (unique or collation). Returns the
+    # number of dropped indexes
+    def drop_changed_indexes(self, collection, models):
+        existing = collection.index_information()
+        dropped = 0
+
+        for model in models:
+            document = model.document
+            index = existing.get(document['name'])
+
+            if index is not None and (bool(index.get('unique')) != bool(document.get('unique')) or
+                                      ('collation' in index) != ('collation' in document)):
+                print('Index ' + document['name'] + ' of ' + collection.full_name + ' changed, creating it again')
+                collection.drop_index(document['name'])
+                dropped += 1
+
+        return dropped
+
+    # Return the missing indexes and the usage of the existing ones ($indexStats) of every collection
+    def get_index_report(self):
+        collections = [(self.client['ScholarSettings']['Users'], self.user_indexes),
+                       (self.client['DataStorage'][self.articles_collection], self.article_indexes)]
+
+        report = []
+        for collection, indexes in collections:
+            expected = [pymongo.IndexModel(keys, **options).document['name'] for keys, options in indexes]
+            usage = {stats['name']: stats['accesses']['ops']
+                     for stats in collection.aggregate([{'$indexStats': {}}])}
+
+            report.append({
+                'collection': collection.full_name,
+                'missing': [name for name in expected if name not in usage],
+                'unused': [name for name, ops in usage.items() if ops == 0 and name != '_id_'],
+                'usage': usage,
+            })
+
+        return report
+
     # Returns all the users from the database
     def get_all_users(self):
         self.database = self.client['ScholarSettings']
@@ -115,73 +240,156 @@ class Database(Database):
         except(InvalidId, ValueError):
             raise DataNotFound()
 
-    # Adds new articles to the user Collection
-    def add_new_articles(self, user_id, articles):
-        collection = 'articles_' + user_id
+    # Adds new articles of the user (one unordered bulk write) and returns the write counts
+    def add_new_articles(self, user_id, articles, crawl_date=None, stored=None):
+        import datetime
+
+        aliases = self.get_user_aliases(user_id) if articles else []
+
         self.database = self.client['DataStorage']
-        self.collection = self.database[collection]
+        self.collection = self.database[self.articles_collection]
+
+        # The upserts search by userId and articleId, so the indexes are created before the first write
+        if self.articles_collection not in indexed_collections:
+            self.create_indexes(self.collection, self.article_indexes)
+            indexed_collections.add(self.articles_collection)
+
+        counts = {'matched': 0, 'upserted': 0, 'modified': 0, 'unchanged': 0}
+        if not articles:
+            return counts
+
+        # Only the new and changed articles are written, so the update date (read by the changes feed) is only
+        # set when the article changes. The unchanged articles are counted as matched and unchanged. The stored
+        # articles already read by the caller (incremental crawls) aren't read again
+        if stored is None:
+            stored = self.get_articles_by_ids(user_id, [article['articleId'] for article in articles])
+
+        # Upsert the articles by articleId, the creation date is only set when the article is inserted. The
+        # location is classified with the current aliases (update_user_aliases classifies them again)
+        date = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        operations = []
+        for article in articles:
+            fields = {key: value for key, value in article.items() if key not in ('_id', 'creation_date',
+                                                                                  'update_date', 'crawl_date')}
+            fields['location'] = get_article_location(article.get('authors'), aliases)
+
+            stored_article = stored.get(article['articleId'])
+            if stored_article is not None and all(stored_article.get(key) == value for key, value in fields.items()):
+                counts['matched'] += 1
+                counts['unchanged'] += 1
+                continue
+
+            # The crawl date is the start of the crawl that wrote the article (the replays compare it with the
+            # date of their pages)
+            fields['userId'] = user_id
+            fields['update_date'] = date
+            if crawl_date is not None:
+                fields['crawl_date'] = crawl_date
+            operations.append(pymongo.UpdateOne({'userId': user_id, 'articleId': article['articleId']},
+                                                {'$set': fields, '$setOnInsert': {'creation_date': date}},
+                                                upsert=True))
+
+        if not operations:
+            return counts
 
-        # Insert the articles to MongoDB
         try:
-            for article in articles:
-                self.collection.update({'articleId': article['articleId']}, self.add_data_time(article), upsert=True)
+            result = self.collection.bulk_write(operations, ordered=False)
+            counts.update({'matched': counts['matched'] + result.matched_count, 'upserted': result.upserted_count,
+                           'modified': result.modified_count})
+        except pymongo.errors.BulkWriteError as error:
+            # The unordered writes continue after an error, return the counts of the successful ones
+            print('Articles bulk write errors: ' + str(len(error.details['writeErrors'])))
+            counts.update({'matched': counts['matched'] + error.details['nMatched'],
+                           'upserted': error.details['nUpserted'], 'modified': error.details['nModified']})
         except(InvalidId, ValueError):
             raise DataNotFound()
 
-    # Updates the currently used user aliases
-    def update_user_aliases(self, user_id, aliases):
+        return counts
+
+    # Apply an update to the user document in the server (the document isn't read nor replaced, so the
+    # concurrent updates of other fields or of other elements of the same list aren't lost)
+    def update_user_fields(self, user_id, update):
+        import datetime
+        from bson.objectid import ObjectId
+
+        self.database = self.client['ScholarSettings']
+        self.collection = self.database['Users']
+
+        update.setdefault('$set', {})['update_date'] = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+        try:
+            result = self.collection.update_one({"_id": ObjectId(user_id)}, update)
+        except(InvalidId, TypeError, ValueError):
+            raise DataNotFound()
+
+        if result.matched_count == 0:
+            raise DataNotFound()
+
+    # Updates the currently used user aliases and, if given, the unused ones (both lists in a single update, so
+    # a reader never sees only one of them changed)
+    def update_user_aliases(self, user_id, aliases, unused_aliases=None):
         if aliases is None:
             return None
 
-        user_data = self.get_user_by_id(user_id)
+        fields = {'scholarAliases': list(aliases)}
+        if unused_aliases is not None:
+            fields['unusedScholarAliases'] = list(unused_aliases)
 
-        if user_data == 'userNotFound':
-            raise DataNotFound()
+        self.update_user_fields(user_id, {'$set': fields})
+        self.classify_user_articles(user_id, aliases)
+
+    # Classify again the articles of the user with the aliases (only the articles that change are written)
+    def classify_user_articles(self, user_id, aliases=None):
+        import datetime
+
+        if aliases is None:
+            aliases = self.get_user_aliases(user_id)
+
+        self.database = self.client['DataStorage']
+        self.collection = self.database[self.articles_collection]
 
-        # Update the currently used Aliases of the User
-        user_data['scholarAliases'] = aliases
-        self.update_user_by_id(user_id, user_data)
+        # Only the articles that change their location are updated (and reported by the changes feed)
+        date = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        aliases = list(aliases)
+        user = self.collection.update_many({'userId': user_id, 'authors': {'$in': aliases},
+                                            'location': {'$ne': 'user'}},
+                                           {'$set': {'location': 'user', 'update_date': date}})
+        others = self.collection.update_many({'userId': user_id, 'authors': {'$nin': aliases},
+                                              'location': {'$ne': 'others'}},
+                                             {'$set': {'location': 'others', 'update_date': date}})
+
+        return {'user': user.modified_count, 'others': others.modified_count}
 
     # Updates the currently unused user aliases
     def update_unused_user_aliases(self, user_id, aliases):
         if aliases is None:
             return None
 
-        user_data = self.get_user_by_id(user_id)
+        self.update_user_fields(user_id, {'$set': {'unusedScholarAliases': list(aliases)}})
 
-        if user_data == 'userNotFound':
-            raise DataNotFound()
-
-        # Update the currently used Aliases of the User
-        user_data['unusedScholarAliases'] = aliases
-        self.update_user_by_id(user_id, user_data)
-
-    # Adds a new unused user alias
+    # Adds new unused user aliases (the aliases already stored aren't added again)
     def add_new_unused_aliases(self, user_id, aliases):
         if aliases is None:
             return None
 
-        user_data = self.get_user_by_id(user_id)
-
-        if user_data == 'userNotFound':
-            raise DataNotFound()
+        self.update_user_fields(user_id, {'$addToSet': {'unusedScholarAliases': {'$each': list(aliases)}}})
 
-        # Update the Unused Aliases of the User
-        for alias in aliases:
-            if alias not in user_data['unusedScholarAliases']:
-                user_data['unusedScholarAliases'].append(alias)
+    # Get the user aliases (only the aliases are read from the user document)
+    def get_user_aliases(self, user_id):
+        from bson.objectid import ObjectId
 
-        # Update the user in the repository
-        self.update_user_by_id(user_id, user_data)
+        self.database = self.client['ScholarSettings']
+        self.collection = self.database['Users']
 
-    # Get the user aliases
-    def get_user_aliases(self, user_id):
-        user_data = self.get_user_by_id(user_id)
+        try:
+            doc = self.collection.find_one({"_id": ObjectId(user_id)}, {'scholarAliases': True})
+        except(InvalidId, TypeError):
+            raise DataNotFound()
 
-        if user_data == 'userNotFound':
+        if doc is None:
             raise DataNotFound()
 
-        return user_data['scholarAliases']
+        return doc.get('scholarAliases', [])
 
     # Get the user unused aliases
     def get_user_unused_aliases(self, user_id):
@@ -213,60 +421,209 @@ class Database(Database):
         if scheduler_job_id is None:
             return None
 
-        user_data = self.get_user_by_id(user_id)
-
-        if user_data == 'userNotFound':
-            raise DataNotFound()
-
-        # Update the Scheduler Job Ids of the User
-        if scheduler_job_id not in user_data['schedulerJobs']:
-            user_data['schedulerJobs'].append(scheduler_job_id)
-
-        # Update the user in the repository
-        self.update_user_by_id(user_id, user_data)
+        self.update_user_fields(user_id, {'$addToSet': {'schedulerJobs': scheduler_job_id}})
 
     # Remove a Scheduler Job ID from the user
     def remove_scheduler_job_id(self, user_id, scheduler_job_id):
         if scheduler_job_id is None:
             return None
 
-        user_data = self.get_user_by_id(user_id)
+        self.update_user_fields(user_id, {'$pull': {'schedulerJobs': scheduler_job_id}})
 
-        if user_data == 'userNotFound':
-            raise DataNotFound()
+    # Returns a page of the articles of an user, sorted by date or quotes (newest or most quoted first). The
+    # location filters the user or the others articles (both by default) and the fields limit the returned
+    # fields. The returned cursor continues with the next page (None on the last page)
+    def get_articles(self, user_id, location=None, sort='date', limit=20, cursor=None, fields=None):
+        if sort not in self.article_sorts:
+            raise ValueError('Unknown sort: ' + str(sort))
+
+        self.check_user_migration(user_id)
+
+        self.database = self.client['DataStorage']
+        self.collection = self.database[self.articles_collection]
+
+        locations = [location] if location in ('user', 'others') else ['user', 'others']
+        query = {'userId': user_id, 'location': {'$in': locations}}
+
+        # Keyset pagination: the articles after the last one of the previous page (the articles without the
+        # sort value are the last ones)
+        if cursor is not None:
+            value, last_id = decode_articles_cursor(cursor, sort)
+            if value is None:
+                query[sort] = None
+                query['_id'] = {'$lt': last_id}
+            else:
+                query['$or'] = [{sort: {'$lt': value}}, {sort: value, '_id': {'$lt': last_id}}, {sort: None}]
+
+        if fields:
+            projection = {field: True for field in fields if field in self.article_fields}
+            projection[sort] = True
+        else:
+            projection = {'userId': False}
+
+        documents = list(self.collection.find(query, projection)
+                         .sort([(sort, pymongo.DESCENDING), ('_id', pymongo.DESCENDING)]).limit(limit + 1))
+
+        next_cursor = None
+        if len(documents) > limit:
+            documents = documents[:limit]
+            next_cursor = encode_articles_cursor(sort, documents[-1].get(sort), documents[-1]['_id'])
 
-        # Update the Scheduler Job Ids of the User
-        if scheduler_job_id in user_data['schedulerJobs']:
-            user_data['schedulerJobs'].remove(scheduler_job_id)
+        for document in documents:
+            document['_id'] = str(document['_id'])
 
-        # Update the user in the repository
-        self.update_user_by_id(user_id, user_data)
+        return {'articles': documents, 'cursor': next_cursor}
+
+    # Iterate over the articles of an user in update order (the cursor reads them in batches), optionally only
+    # the user or the others articles and the articles updated from the 'since' date ('%Y-%m-%d %H:%M:%S')
+    def iter_articles(self, user_id, location=None, since=None, batch_size=500):
+        self.check_user_migration(user_id)
+
+        self.database = self.client['DataStorage']
+        self.collection = self.database[self.articles_collection]
+
+        query = {'userId': user_id}
+        if location in ('user', 'others'):
+            query['location'] = location
+        if since is not None:
+            query['update_date'] = {'$gte': since}
+
+        cursor = self.collection.find(query, {'_id': False, 'userId': False}, batch_size=batch_size)
+        return cursor.sort([('update_date', pymongo.ASCENDING), ('_id', pymongo.ASCENDING)])
+
+    # Returns the articles of an user created or updated after the cursor, in update order. The articles updated
+    # in the last 'lag' seconds aren't returned yet, so the writes of the same second that finish later aren't
+    # skipped by the cursor. The returned cursor continues after the last article (the same one if there are
+    # no changes) and 'more' is True when there are more changes to read
+    def get_article_changes(self, user_id, cursor=None, limit=100, location=None, lag=2):
+        import datetime
 
-    # Returns all the articles related to an user from the user collection
-    def get_articles(self, user_id):
-        docs = {'user': [], 'others': []}
-        collection = 'articles_' + user_id
-        aliases = self.get_user_aliases(user_id)
+        self.check_user_migration(user_id)
 
         self.database = self.client['DataStorage']
-        self.collection = self.database[collection]
+        self.collection = self.database[self.articles_collection]
+
+        until = (datetime.datetime.utcnow() - datetime.timedelta(seconds=lag)).strftime('%Y-%m-%d %H:%M:%S')
+        query = {'userId': user_id, 'update_date': {'$lt': until}}
+        if location in ('user', 'others'):
+            query['location'] = location
+
+        if cursor is not None:
+            value, last_id = decode_articles_cursor(cursor, 'update_date')
+            query['$or'] = [{'update_date': {'$gt': value}}, {'update_date': value, '_id': {'$gt': last_id}}]
+
+        documents = list(self.collection.find(query, {'userId': False})
+                         .sort([('update_date', pymongo.ASCENDING), ('_id', pymongo.ASCENDING)]).limit(limit + 1))
+
+        more = len(documents) > limit
+        documents = documents[:limit]
+
+        if documents:
+            cursor = encode_articles_cursor('update_date', documents[-1]['update_date'], documents[-1]['_id'])
 
-        # Extract the data and Dump it to remove the BSON specific kirks
-        for document in self.collection.find():
-            doc = json.loads(dumps(document))
-            doc['_id'] = doc['_id']['$oid']
+        for document in documents:
+            document['_id'] = str(document['_id'])
 
-            location = 'others'
-            for alias in aliases:
-                if doc['authors'] is not None and alias in doc['authors']:
-                    location = 'user'
-                    break
+        return {'articles': documents, 'cursor': cursor, 'more': more}
 
-            # Divide the articles into 2 groups (the user ones an the others)
-            docs[location].append(doc)
+    # Returns the stored articles of an user with the desired ids (indexed by articleId)
+    def get_articles_by_ids(self, user_id, article_ids):
+        self.check_user_migration(user_id)
+
+        self.database = self.client['DataStorage']
+        self.collection = self.database[self.articles_collection]
+
+        docs = {}
+        for document in self.collection.find({'userId': user_id, 'articleId': {'$in': article_ids}},
+                                             {'_id': False, 'userId': False}):
+            docs[document['articleId']] = document
 
         return docs
 
+    # Copy the articles of the old per user collections ('articles_<userId>') into the articles collection.
+    # The copies only insert the missing articles ($setOnInsert), so the application can keep writing and
+    # the migration can be stopped and run again. Returns the copied articles of every collection
+    def migrate_user_collections(self, batch_size=1000, drop=False):
+        database = self.client['DataStorage']
+        articles = database[self.articles_collection]
+        self.create_indexes(articles, self.article_indexes)
+
+        migrated = {}
+        for name in sorted(database.list_collection_names()):
+            if not name.startswith('articles_'):
+                continue
+
+            user_id = name[len('articles_'):]
+            migrated[user_id] = self.migrate_user_collection(user_id, batch_size)
+
+            # Drop the old collection only when all its articles are in the articles collection
+            if drop and not migrated[user_id]['skipped'] and \
+                    articles.count_documents({'userId': user_id}) >= database[name].count_documents({}):
+                database[name].drop()
+                migrated[user_id]['dropped'] = True
+
+        return migrated
+
+    # Copy the articles of the old collection of a user into the articles collection (see migrate_user_collections)
+    def migrate_user_collection(self, user_id, batch_size=1000):
+        database = self.client['DataStorage']
+        articles = database[self.articles_collection]
+        legacy = database['articles_' + user_id]
+
+        result = {'articles': 0, 'inserted': 0, 'skipped': 0, 'dropped': False}
+        operations = []
+
+        # The copies are classified with the user aliases when they are inserted, so the articles aren't
+        # updated again (their dates are kept)
+        try:
+            aliases = self.get_user_aliases(user_id)
+        except DataNotFound:
+            print('User ' + user_id + ' not found, its articles are not classified')
+            aliases = None
+
+        for document in legacy.find({}, {'_id': False}).sort('_id', pymongo.ASCENDING):
+            # The documents without articleId can't be upserted by (userId, articleId), they are reported
+            if document.get('articleId') is None:
+                result['skipped'] += 1
+                continue
+
+            document['userId'] = user_id
+            if aliases is not None and 'location' not in document:
+                document['location'] = get_article_location(document.get('authors'), aliases)
+
+            operations.append(pymongo.UpdateOne({'userId': user_id, 'articleId': document['articleId']},
+                                                {'$setOnInsert': document}, upsert=True))
+
+            if len(operations) >= batch_size:
+                result['inserted'] += articles.bulk_write(operations, ordered=False).upserted_count
+                result['articles'] += len(operations)
+                operations = []
+
+        if operations:
+            result['inserted'] += articles.bulk_write(operations, ordered=False).upserted_count
+            result['articles'] += len(operations)
+
+        return result
+
+    # Online migration: before the first read of the articles of a user in the process, the articles of its old
+    # collection (if it still exists) are copied into the articles collection, so the users that weren't
+    # migrated by manage.py migrate-articles keep their articles
+    def check_user_migration(self, user_id):
+        if user_id in migrated_users:
+            return
+
+        database = self.client['DataStorage']
+        if database.list_collection_names(filter={'name': 'articles_' + str(user_id)}):
+            if self.articles_collection not in indexed_collections:
+                self.create_indexes(database[self.articles_collection], self.article_indexes)
+                indexed_collections.add(self.articles_collection)
+
+            result = self.migrate_user_collection(str(user_id))
+            print('Articles of ' + str(user_id) + ' migrated: ' + str(result['inserted']) + ' inserted, ' +
+                  str(result['skipped']) + ' skipped without articleId')
+
+        migrated_users.add(user_id)
+
     # Add a time to the documents to know the update and creation date
     def add_data_time(self, data):
         import datetime
@@ -310,7 +667,8 @@ class Scheduler(Scheduler):
         else:
             collection = 'scheduler_jobs'
 
-        client = pymongo.MongoClient(self.host)
+        client = get_mongo_client(self.host)
+        self.settings = settings
 
         self.name = 'MongoDB'
         self.job_stores = {
@@ -320,12 +678,6 @@ class Scheduler(Scheduler):
         # Execute the parent method to obtain the default values
         super(Scheduler, self).__init__(settings)
 
-    # Check the connection to the desired database
+    # Check the connection to the desired database (cached health check)
     def check_connection(self, max_delay=100):
-        try:
-            client = pymongo.MongoClient(self.host, serverSelectionTimeoutMS=max_delay)
-            client.server_info()  # Make the server info request to make a connection to the server
-        except pymongo.errors.ServerSelectionTimeoutError as err:
-            print(err)
-            return False
-        return True
+        return check_mongo_connection(self.host, self.settings, max_delay)
@@ -7,7 +7,7 @@ environment variables, or set the default values in code here.
 
 
 class BaseConfig(object):
-    from os import environ
+    from os import environ, path
 
     DEBUG = False
     SECRET_KEY = '\x0c\'\xbe\xc5/\x82\'\xca\xde?\xe8\x95Z\xc4`\x7f>ces\xad\x0e\xdc\xf3'
@@ -19,12 +19,71 @@ class BaseConfig(object):
             'MONGODB_HOST': environ.get('MONGODB_HOST', None),
             'MONGODB_DATABASE': environ.get('MONGODB_DATABASE', 'ScholarSettings'),
             'MONGODB_COLLECTION': environ.get('MONGODB_COLLECTION', 'Users'),
+            'MONGODB_HEALTH_TTL': int(environ.get('MONGODB_HEALTH_TTL', 30)),  # Seconds to cache the server status
+            'MONGODB_FAILURE_TTL': int(environ.get('MONGODB_FAILURE_TTL', 5)),  # Seconds before checking it again
         }
     elif REPOSITORY_NAME == 'memory':
         REPOSITORY_SETTINGS = {}
     else:
         raise ValueError('Unknown repository.')
 
+    # Articles per page of the articles view and API (the 'limit' of the API can't be bigger than the max)
+    ARTICLES_PAGE_SIZE = int(environ.get('ARTICLES_PAGE_SIZE', 20))
+    ARTICLES_MAX_PAGE_SIZE = int(environ.get('ARTICLES_MAX_PAGE_SIZE', 200))
+    ARTICLES_EXPORT_BATCH_SIZE = int(environ.get('ARTICLES_EXPORT_BATCH_SIZE', 500))  # Articles per cursor batch
+    ARTICLES_CHANGES_LAG = int(environ.get('ARTICLES_CHANGES_LAG', 2))  # Seconds before a change is in the feed
+
+    # HTML parser backend used by the extractors ('html5lib', 'lxml', 'html.parser' or 'selectolax')
+    HTML_PARSER = environ.get('HTML_PARSER', 'html5lib')
+
+    # Keep-alive HTTP sessions of the crawlers (connection pool sizes per session)
+    HTTP_SESSION_SETTINGS = {
+        'pool_connections': int(environ.get('HTTP_POOL_CONNECTIONS', 4)),
+        'pool_maxsize': int(environ.get('HTTP_POOL_MAXSIZE', 4)),
+        'pool_block': False,
+    }
+
+    # Crawler settings (default options of the extraction jobs)
+    CRAWLER_SETTINGS = {
+        'engine': environ.get('CRAWLER_ENGINE', 'thread'),  # 'thread' (one scheduler thread per crawl) or 'async'
+        'incremental': environ.get('CRAWLER_INCREMENTAL', 'false').lower() == 'true',  # Stop at known articles
+        'pipeline': environ.get('CRAWLER_PIPELINE', 'false').lower() == 'true',  # Download next page while storing
+        'pipeline_queue_size': int(environ.get('CRAWLER_PIPELINE_QUEUE_SIZE', 2)),
+        'async_max_connections': int(environ.get('CRAWLER_ASYNC_MAX_CONNECTIONS', 100)),
+        'async_max_crawls': int(environ.get('CRAWLER_ASYNC_MAX_CRAWLS', 500)),
+        'async_blocking_workers': int(environ.get('CRAWLER_ASYNC_BLOCKING_WORKERS', 10)),
+        'scholar_domain': environ.get('SCHOLAR_DOMAIN', 'scholar.google.es'),  # Changed by the crawl benchmark
+        'scholar_scheme': environ.get('SCHOLAR_SCHEME', 'https'),
+        'page_storage': True,  # Save the downloaded pages (disabled by the replay, which doesn't download pages)
+    }
+
+    # Rate limit of the requests of all the crawlers, per domain and proxy identity ('memory' backend for one
+    # process, 'sqlite' to share the limits between the local processes using the file in 'path')
+    RATE_LIMIT_SETTINGS = {
+        'backend': environ.get('RATE_LIMIT_BACKEND', 'memory'),
+        'path': environ.get('RATE_LIMIT_PATH', None),
+        'requests_per_second': float(environ.get('RATE_LIMIT_REQUESTS_PER_SECOND', 0.5)),
+        'burst': int(environ.get('RATE_LIMIT_BURST', 3)),
+        'min_interval': float(environ.get('RATE_LIMIT_MIN_INTERVAL', 1.0)),
+    }
+
+    # Backoff of the request retries (the wait range is multiplied on every retry, up to max_wait seconds)
+    BACKOFF_SETTINGS = {
+        'multiplier': float(environ.get('BACKOFF_MULTIPLIER', 2)),
+        'max_wait': float(environ.get('BACKOFF_MAX_WAIT', 120)),
+    }
+
+    # Circuit breaker per host and proxy identity: opens after 'failure_threshold' consecutive blocks (captchas)
+    # for 'cooldown' seconds (doubled on every trip up to 'max_cooldown'), then a single recovery probe is allowed.
+    # The requests that would wait more than 'max_wait' seconds are aborted
+    CIRCUIT_BREAKER_SETTINGS = {
+        'failure_threshold': int(environ.get('CIRCUIT_FAILURE_THRESHOLD', 3)),
+        'cooldown': float(environ.get('CIRCUIT_COOLDOWN', 60)),
+        'max_cooldown': float(environ.get('CIRCUIT_MAX_COOLDOWN', 1800)),
+        'probe_wait': float(environ.get('CIRCUIT_PROBE_WAIT', 5)),
+        'max_wait': float(environ.get('CIRCUIT_MAX_WAIT', 300)),
+    }
+
     API_NAME = "Scholar Crawler API"
     API_VERSION = "1.0"
 
@@ -35,6 +94,28 @@ class BaseConfig(object):
         'control_port': 9051,
         'protocol': 'socks5h',
         'control_pass': 'P4ssW0rd',  # Hash 16:1EECF718CF92C0006045C9C9BC2E1D10E21B9D005C3C86746C7FFD4783
+        'socks_ports': [int(port) for port in environ.get('TOR_SOCKS_PORTS', '9050').split(',')],
+        'circuits_per_port': int(environ.get('TOR_CIRCUITS_PER_PORT', 4)),  # Isolated circuits (SOCKS usernames)
+        'health_ttl': int(environ.get('TOR_HEALTH_TTL', 30)),  # Seconds to cache the Tor bootstrap status
+    }
+
+    # Storage of the downloaded pages: 'archive' (one compressed archive per crawl) or 'store' (deduplicated pages)
+    PAGE_STORAGE_SETTINGS = {
+        'backend': environ.get('PAGE_STORAGE_BACKEND', 'archive'),
+        'archive_path': environ.get('PAGE_ARCHIVE_PATH',
+                                    path.join(path.dirname(__file__), 'crawler/storage/extraction')),
+        'store_path': environ.get('PAGE_STORE_PATH', path.join(path.dirname(__file__), 'crawler/storage/pages')),
+        'retention_days': int(environ.get('PAGE_STORE_RETENTION_DAYS', 180)),  # Used by 'manage.py pages prune'
+        'compress_level': int(environ.get('PAGE_ARCHIVE_COMPRESS_LEVEL', 6)),
+        'queue_size': int(environ.get('PAGE_ARCHIVE_QUEUE_SIZE', 1000)),  # Max pages waiting for the writer thread
+    }
+
+    # Proxy providers used by the crawlers ('direct', 'static' and/or 'tor'), chosen by the health of their endpoints
+    HTTP_PROVIDERS_SETTINGS = {
+        'providers': environ.get('HTTP_PROVIDERS', 'direct').split(','),
+        'static_proxies': [proxy for proxy in environ.get('HTTP_STATIC_PROXIES', '').split(',') if proxy],
+        'latency_decay': float(environ.get('HTTP_PROVIDERS_LATENCY_DECAY', 0.3)),  # Weight of the last latency
+        'min_weight': float(environ.get('HTTP_PROVIDERS_MIN_WEIGHT', 0.01)),  # Keeps probing the bad endpoints
     }
 
 
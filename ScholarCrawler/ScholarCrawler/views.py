@@ -125,21 +125,19 @@ def store_aliases(default_url='settings'):
 
 @app.route('/articles')
 @login_required
-def articles():
-    # Renders the articles page, with a list of ALL the articles.
+def articles(default_url='home'):
+    # Renders a page of the articles (the location, sort and cursor query arguments select the page)
     api_call = make_api_callback('api_function', 'get_articles')
 
-    if 'user' not in api_call['message']:
-        api_call['message'] = {
-            'user': [],
-            'others': [],
-        }
+    if 'error' in api_call['message']:
+        flash(api_call['message']['error'])
+        return redirect(url_for(default_url))
 
     return render_template(
         'articles.html',
         title='Articles for ' + session['user']['name'],
         year=datetime.datetime.now().year,
-        articles=api_call['message']
+        page=api_call['message']
     )
 
 
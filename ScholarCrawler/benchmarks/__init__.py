@@ -0,0 +1,3 @@
+"""
+Benchmarks for the crawler extraction and load.
+"""
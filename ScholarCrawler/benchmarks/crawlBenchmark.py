@@ -0,0 +1,179 @@
+"""
+End-to-end crawl benchmark against the local Scholar stand-in (see scholarStandIn.py).
+
+Runs create_crawler_and_extract for the desired number of users and concurrency, and reports the pages/sec,
+articles/sec, p50/p99 page latency and the max memory of the process. The articles are written in the
+configured repository (REPOSITORY_NAME) with new benchmark users, so run it against a test database.
+
+Usage: python benchmarks/crawlBenchmark.py [--users 20] [--concurrency 5] [--engine thread] [--pages 10]
+       [--latency 0.2] [--error-rate 0.01] [--captcha-rate 0.01] [--rate 1000]
+"""
+
+import argparse
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
+
+# Make the application packages importable when running the script directly
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'ScholarCrawler'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+class CrawlRecorder(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.articles = 0
+
+    def add_page(self, latency):
+        with self.lock:
+            self.latencies.append(latency)
+
+    def add_articles(self, data):
+        with self.lock:
+            self.articles += len(data['articles']) if data is not None and data['articles'] else 0
+
+    def get_percentile(self, percentile):
+        if not self.latencies:
+            return 0.0
+
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100.0))]
+
+
+# Measure the time of every page download (both engines, including the rate limiter and retry waits)
+# and count the processed articles (in write_data, used by the sequential and the pipelined extraction)
+def record_crawls(crawler_class, recorder):
+    from functools import wraps
+
+    extract_page = crawler_class.extract_page
+    async_extract_page = crawler_class.async_extract_page
+    write_data = crawler_class.write_data
+
+    @wraps(extract_page)
+    def timed_extract_page(self, parameters):
+        start = perf_counter()
+        try:
+            return extract_page(self, parameters)
+        finally:
+            recorder.add_page(perf_counter() - start)
+
+    @wraps(async_extract_page)
+    async def timed_async_extract_page(self, parameters, engine):
+        start = perf_counter()
+        try:
+            return await async_extract_page(self, parameters, engine)
+        finally:
+            recorder.add_page(perf_counter() - start)
+
+    @wraps(write_data)
+    def counted_write_data(self, db, data, articles):
+        write_data(self, db, data, articles)
+        recorder.add_articles(data)
+
+    crawler_class.extract_page = timed_extract_page
+    crawler_class.async_extract_page = timed_async_extract_page
+    crawler_class.write_data = counted_write_data
+
+
+# Create the benchmark users in the repository (the crawlers store their unknown aliases in them)
+def create_users(count):
+    import uuid
+    from ScholarCrawler import app
+    from models.factory import connect_to_database
+
+    db = connect_to_database(app.config['REPOSITORY_NAME'], app.config['REPOSITORY_SETTINGS'])
+    run_id = uuid.uuid4().hex[:8]
+    users = []
+
+    for index in range(count):
+        name = 'Author ' + run_id + ' ' + str(index)
+        mail = 'benchmark-' + run_id + '-' + str(index) + '@localhost'
+        db.add_new_user({'name': name, 'mail': mail, 'password': '', 'scholarUser': name,
+                         'scholarAliases': [name], 'unusedScholarAliases': []})
+
+        users.append({'id': str(db.get_user_by_mail(mail)['_id']), 'user': mail, 'scholarUser': name,
+                      'scholarAliases': [name]})
+
+    return users
+
+
+# Max resident memory of the process in MB (None where the resource module isn't available)
+def get_max_memory():
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return memory / 1024.0 / 1024.0 if sys.platform == 'darwin' else memory / 1024.0
+
+
+def main():
+    from scholarStandIn import create_arguments, create_settings, start_stand_in
+    from ScholarCrawler import app
+    from crawler.crawlerGeneral import create_crawler_and_extract
+    from crawler.googleScholarArticles import GoogleScholarArticles
+
+    parser = argparse.ArgumentParser(description='End-to-end crawl benchmark')
+    parser.add_argument('--users', type=int, default=20, help='Number of crawls (one per user)')
+    parser.add_argument('--concurrency', type=int, default=5, help='Crawls running at the same time (thread engine)')
+    parser.add_argument('--engine', choices=('thread', 'async'), default='thread', help='Crawler engine')
+    parser.add_argument('--incremental', action='store_true', help='Incremental extraction')
+    parser.add_argument('--pipeline', action='store_true', help='Pipelined extraction')
+    parser.add_argument('--rate', type=float, default=1000.0, help='Requests per second of the rate limiter')
+    create_arguments(parser)
+    args = parser.parse_args()
+
+    # The stand-in is a single host, so the rate limiter would serialize all the crawls
+    app.config['RATE_LIMIT_SETTINGS'].update({'requests_per_second': args.rate, 'burst': args.rate,
+                                              'min_interval': 0})
+    if args.engine == 'async':
+        app.config['CRAWLER_SETTINGS']['async_max_crawls'] = args.concurrency
+
+    settings = create_settings(args)
+    server = start_stand_in(settings)
+    recorder = CrawlRecorder()
+    record_crawls(GoogleScholarArticles, recorder)
+
+    options = {
+        'engine': args.engine,
+        'incremental': args.incremental,
+        'pipeline': args.pipeline,
+        'scholar_domain': '127.0.0.1:' + str(server.server_port),
+        'scholar_scheme': 'http',
+    }
+    users = create_users(args.users)
+
+    start = perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        list(executor.map(lambda user: create_crawler_and_extract(user, 'googleScholarArticles', options), users))
+
+    # The async engine runs the crawls in background, wait until all of them finish
+    if args.engine == 'async':
+        from crawler.crawlerAsync import get_async_engine
+        while get_async_engine().get_status()['crawls']:
+            sleep(0.05)
+
+    elapsed = perf_counter() - start
+    server.shutdown()
+
+    pages = len(recorder.latencies)
+    memory = get_max_memory()
+
+    print('engine=%s users=%d concurrency=%d elapsed=%.2fs' % (args.engine, args.users, args.concurrency, elapsed))
+    print('requests=%d errors=%d captchas=%d' % (settings.requests, settings.errors, settings.captchas))
+    print('pages/sec=%.2f' % (pages / elapsed))
+    print('articles/sec=%.2f' % (recorder.articles / elapsed))
+    print('page latency p50=%.1fms p99=%.1fms' % (recorder.get_percentile(50) * 1000,
+                                                  recorder.get_percentile(99) * 1000))
+    print('max memory=%s' % ('%.1fMB' % memory if memory is not None else 'n/a'))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
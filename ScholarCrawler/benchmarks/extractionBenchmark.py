@@ -0,0 +1,96 @@
+"""
+Microbenchmark of the article field extraction over saved Google Scholar result pages.
+
+Compares the extraction without shared selections (every extractor runs its own selectors, "before")
+with the shared extraction plan (every selector is evaluated once per article, "after").
+
+Usage: python benchmarks/extractionBenchmark.py PATH [PATH ...] [--parser html5lib] [--repeat 5]
+PATH can be a saved .html page, a directory with saved pages or an extraction .zip file.
+"""
+
+import argparse
+import os
+import sys
+import zipfile
+from time import perf_counter
+
+# Make the application packages importable when running the script directly
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'ScholarCrawler'))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('REPOSITORY_NAME', 'memory')
+
+
+# Load the saved articles pages from files, directories and zip archives
+def load_pages(paths):
+    pages = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.startswith('articles-') and name.endswith('.html'):
+                    with open(os.path.join(path, name), 'rb') as file:
+                        pages.append(file.read())
+        elif zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                for name in sorted(archive.namelist()):
+                    if os.path.basename(name).startswith('articles-'):
+                        pages.append(archive.read(name))
+        else:
+            with open(path, 'rb') as file:
+                pages.append(file.read())
+
+    return pages
+
+
+# Process all the pages the desired number of times and return the best total time
+def run_extraction(crawler, pages, repeat):
+    best = None
+    articles = 0
+
+    for _ in range(repeat):
+        articles = 0
+        start = perf_counter()
+        for page in pages:
+            data = crawler.process_page(page)
+            articles += len(data['articles']) if data is not None else 0
+        elapsed = perf_counter() - start
+        best = elapsed if best is None or elapsed < best else best
+
+    return best, articles
+
+
+def main():
+    from ScholarCrawler import app
+    from crawler.googleScholarArticles import GoogleScholarArticles
+    from crawler.htmlParsers.factory import create_html_parser
+
+    parser = argparse.ArgumentParser(description='Article extraction microbenchmark')
+    parser.add_argument('paths', nargs='+', help='Saved pages (.html files, directories or .zip files)')
+    parser.add_argument('--parser', default=app.config['HTML_PARSER'], help='HTML parser backend')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of runs (the best one is reported)')
+    args = parser.parse_args()
+
+    pages = load_pages(args.paths)
+    if not pages:
+        print('No articles pages found')
+        return 1
+
+    crawler = GoogleScholarArticles({'id': 'benchmark', 'user': 'benchmark', 'scholarUser': 'benchmark',
+                                     'scholarAliases': []})
+    crawler.htmlParser = create_html_parser(args.parser)
+
+    results = {}
+    for mode, share_selections in (('before', False), ('after', True)):
+        crawler.shareSelections = share_selections
+        results[mode] = run_extraction(crawler, pages, args.repeat)
+        elapsed, articles = results[mode]
+        print('%-6s parser=%s pages=%d articles=%d total=%.3fs per_page=%.2fms' %
+              (mode, args.parser, len(pages), articles, elapsed, elapsed * 1000 / len(pages)))
+
+    print('speedup: %.2fx' % (results['before'][0] / results['after'][0]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""
+Local stand-in of Google Scholar for the crawl benchmarks (no request is sent to Google).
+
+Serves the main page (/), the NID cookie page (/gen_nid) and paginated result pages (/scholar) with
+the same structure the crawler extracts: .gs_r article blocks, English or Spanish bottom lines and the
+#gs_n pagination. The latency, the error rate (HTTP 503) and the captcha rate can be configured.
+
+Usage: python benchmarks/scholarStandIn.py [--port 8000] [--pages 10] [--latency 0.2] [--captcha-rate 0.01]
+"""
+
+import argparse
+import hashlib
+import html
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+MAIN_PAGE = '<html><head><title>Google Académico</title></head><body><form action="/scholar">' \
+            '<input name="q"></form></body></html>'
+
+CAPTCHA_PAGE = '<html><head><title>Sorry...</title></head><body><div id="gs_captcha_ccl">' \
+               '<form id="gs_captcha_f"><div class="g-recaptcha"></div></form>' \
+               'Please show you\'re not a robot (captcha)</div></body></html>'
+
+BOTTOM_LINES = {
+    'en': ('Cited by %d', 'Related articles', 'All %d versions'),
+    'es': ('Citado por %d', 'Artículos relacionados', 'Las %d versiones'),
+}
+
+
+class StandInSettings(object):
+    def __init__(self, pages=10, articles=10, latency=0.0, jitter=0.0, error_rate=0.0, captcha_rate=0.0,
+                 language='mixed', seed=None):
+        self.pages = pages  # Result pages of every query
+        self.articles = articles  # Articles per page
+        self.latency = latency  # Seconds before answering (plus a random jitter)
+        self.jitter = jitter
+        self.errorRate = error_rate  # Probability of an HTTP 503 answer
+        self.captchaRate = captcha_rate  # Probability of a captcha page (HTTP 200)
+        self.language = language  # 'en', 'es' or 'mixed' (alternates the language of the pages)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.captchas = 0
+
+    # Choose the answer of a request: 'error', 'captcha' or 'ok'
+    def get_outcome(self):
+        with self.lock:
+            self.requests += 1
+            value = self.random.random()
+
+            if value < self.errorRate:
+                self.errors += 1
+                return 'error'
+
+            if value < self.errorRate + self.captchaRate:
+                self.captchas += 1
+                return 'captcha'
+
+            return 'ok'
+
+    def get_delay(self):
+        with self.lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+
+# Generate a results page of a query (the articles are always the same for the same query and start)
+def generate_results_page(settings, query, start):
+    page = start // settings.articles
+    language = settings.language if settings.language != 'mixed' else ('es' if page % 2 else 'en')
+    quotes_text, related_text, versions_text = BOTTOM_LINES[language]
+    blocks = []
+
+    for position in range(settings.articles):
+        seed = hashlib.sha1((query + '-' + str(start + position)).encode()).hexdigest()
+        cid = seed[:12]
+        number = int(seed[12:20], 16)
+        title = html.escape('Article %d about %s' % (start + position, query))
+        author = html.escape(query)
+
+        blocks.append(
+            '<div class="gs_r gs_or gs_scl" data-cid="%s" data-rp="%d"><div class="gs_ri">'
+            '<h3 class="gs_rt"><a href="https://example.org/%s">%s</a></h3>'
+            '<div class="gs_a"><a href="/citations?user=%s">%s</a>, <a href="/citations?user=%s">Co Author %d</a>'
+            ' - Journal %d, %d - example.org</div>'
+            '<div class="gs_rs">Abstract of the article %s.</div>'
+            '<div class="gs_fl"><a href="/scholar?cites=%d">%s</a> <a href="/scholar?q=related:%s:scholar.google.com/">'
+            '%s</a> <a href="/scholar?cluster=%d">%s</a></div></div></div>' % (
+                cid, position, cid, title, seed[20:28], author, seed[28:36], number % 50, number % 100,
+                1990 + number % 30, cid, number, quotes_text % (number % 500), cid, related_text, number,
+                versions_text % (1 + number % 9)))
+
+    # The last page has no link to the next one
+    pagination = ''
+    if page + 1 < settings.pages:
+        next_url = '/scholar?' + urlencode({'start': start + settings.articles, 'q': query, 'hl': 'all',
+                                            'as_sdt': '0,5'})
+        pagination = '<div id="gs_n"><table><tr><td align="left" nowrap><a href="%s"><b>%s</b></a></td>' \
+                     '</tr></table></div>' % (html.escape(next_url), 'Siguiente' if language == 'es' else 'Next')
+
+    return '<html><head><title>%s - Google Académico</title></head><body><div id="gs_res_ccl_mid">%s</div>%s' \
+           '</body></html>' % (html.escape(query), ''.join(blocks), pagination)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    settings = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        time.sleep(self.settings.get_delay())
+
+        outcome = self.settings.get_outcome()
+        status = 200
+        headers = {'Content-Type': 'text/html; charset=UTF-8'}
+
+        if outcome == 'error':
+            status = 503
+            body = '<html><body>Service Unavailable</body></html>'
+        elif outcome == 'captcha':
+            body = CAPTCHA_PAGE
+        elif url.path == '/':
+            body = MAIN_PAGE
+        elif url.path == '/gen_nid':
+            body = ''
+            headers['Set-Cookie'] = 'NID=' + hashlib.sha1(str(time.time()).encode()).hexdigest() + '; Path=/'
+        elif url.path == '/scholar':
+            params = parse_qs(url.query)
+            start = int(params['start'][0]) if 'start' in params else 0
+            body = generate_results_page(self.settings, params['q'][0] if 'q' in params else '', start)
+        else:
+            status = 404
+            body = '<html><body>Not Found</body></html>'
+
+        content = body.encode()
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Start the stand-in server in a daemon thread and return it (server.server_port has the port)
+def start_stand_in(settings, host='127.0.0.1', port=0):
+    handler = type('Handler', (StandInHandler,), {'settings': settings})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+
+    threading.Thread(target=server.serve_forever, name='scholar-stand-in', daemon=True).start()
+    return server
+
+
+def create_arguments(parser):
+    parser.add_argument('--pages', type=int, default=10, help='Result pages of every query')
+    parser.add_argument('--articles', type=int, default=10, help='Articles per page')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds before every answer')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random variation of the latency (seconds)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Probability of an HTTP 503 answer')
+    parser.add_argument('--captcha-rate', type=float, default=0.0, help='Probability of a captcha page')
+    parser.add_argument('--language', choices=('en', 'es', 'mixed'), default='mixed', help='Bottom line language')
+    parser.add_argument('--seed', type=int, help='Seed of the injected errors and latencies')
+
+
+def create_settings(args):
+    return StandInSettings(args.pages, args.articles, args.latency, args.jitter, args.error_rate, args.captcha_rate,
+                           args.language, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local Google Scholar stand-in server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    create_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_stand_in(create_settings(args), args.host, args.port)
+    print('Scholar stand-in listening on http://%s:%d' % (args.host, server.server_port))
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
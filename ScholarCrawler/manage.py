@@ -0,0 +1,202 @@
+"""
+Maintenance commands of the ScholarCrawler application.
+
+Usage: python manage.py pages {status,find,show,prune,compact} [options]
+       python manage.py replay [PATH ...] [--store] [--user USER] [--since DATE] [--workers N] [--batch-size N]
+       python manage.py indexes [--create]
+       python manage.py migrate-articles [--batch-size N] [--drop]
+       python manage.py classify-articles [--user USER]
+"""
+
+import argparse
+import datetime
+import os
+import sys
+
+# The crawlers are imported as top level packages (same as the application does)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ScholarCrawler'))
+
+
+# Parse a date like 2019-05-01 or 2019-05-01T10:30 into a timestamp
+def parse_date(value):
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def get_page_store():
+    from ScholarCrawler import app
+    from crawler.pageStore import PageStore
+
+    return PageStore(app.config['PAGE_STORAGE_SETTINGS']['store_path'])
+
+
+def pages_status(args):
+    for key, value in get_page_store().get_status().items():
+        print(key + ': ' + str(value))
+
+
+def pages_find(args):
+    entries = get_page_store().find(args.user, args.crawl, args.page, args.since, args.until, args.deleted)
+
+    for entry in entries:
+        print('%s %s %d page=%d %s %s %d%s' % (
+            datetime.datetime.fromtimestamp(entry['date']).isoformat(sep=' ', timespec='seconds'), entry['user'],
+            entry['crawl'], entry['page'], entry['name'], entry['digest'], entry['size'],
+            ' deleted' if entry['deleted'] else ''))
+
+    print(str(len(entries)) + ' pages')
+
+
+def pages_show(args):
+    sys.stdout.buffer.write(get_page_store().read_page(args.digest))
+
+
+def pages_prune(args):
+    from ScholarCrawler import app
+
+    days = args.days if args.days is not None else app.config['PAGE_STORAGE_SETTINGS']['retention_days']
+    print(str(get_page_store().prune(days)) + ' pages older than ' + str(days) + ' days marked as deleted')
+
+
+def pages_compact(args):
+    result = get_page_store().compact()
+    print(str(result['removed_records']) + ' records and ' + str(result['removed_blobs']) + ' blobs removed')
+
+
+def replay(args):
+    from ScholarCrawler import app
+    from crawler.replayEngine import ReplayEngine
+
+    engine = ReplayEngine(workers=args.workers, batch_size=args.batch_size)
+    settings = app.config['PAGE_STORAGE_SETTINGS']
+
+    # By default the pages of the archives (and the legacy zip files) in the archive path are replayed
+    if args.store:
+        pages = engine.iter_store(get_page_store(), args.user, args.since)
+    else:
+        pages = engine.iter_files(args.paths if args.paths else [settings['archive_path']])
+
+    for key, value in engine.run(pages, args.user).items():
+        print(key + ': ' + str(value))
+
+
+def indexes(args):
+    from ScholarCrawler import app
+    from models.factory import connect_to_database
+
+    db = connect_to_database(app.config['REPOSITORY_NAME'], app.config['REPOSITORY_SETTINGS'])
+
+    if args.create:
+        db.ensure_indexes()
+
+    report = db.get_index_report()
+    if report is None:
+        print('The ' + db.name + ' repository has no indexes')
+        return
+
+    # The usage counts ($indexStats) start from zero when the server restarts
+    for collection in report:
+        print(collection['collection'] + ': ' + ', '.join(name + '=' + str(ops) for name, ops in
+                                                           collection['usage'].items()))
+        if collection['missing']:
+            print('  missing: ' + ', '.join(collection['missing']))
+        if collection['unused']:
+            print('  unused: ' + ', '.join(collection['unused']))
+
+
+def migrate_articles(args):
+    from ScholarCrawler import app
+    from models.factory import connect_to_database
+
+    db = connect_to_database(app.config['REPOSITORY_NAME'], app.config['REPOSITORY_SETTINGS'])
+    migrated = db.migrate_user_collections(args.batch_size, args.drop)
+
+    if migrated is None:
+        print('The ' + db.name + ' repository has no articles to migrate')
+        return
+
+    for user_id, result in migrated.items():
+        print('%s: %d articles, %d inserted%s%s' % (user_id, result['articles'], result['inserted'],
+                                                    ', %d skipped without articleId (collection kept)' %
+                                                    result['skipped'] if result['skipped'] else '',
+                                                    ', collection dropped' if result['dropped'] else ''))
+
+    print(str(len(migrated)) + ' collections migrated')
+
+
+def classify_articles(args):
+    from ScholarCrawler import app
+    from models.factory import connect_to_database
+
+    db = connect_to_database(app.config['REPOSITORY_NAME'], app.config['REPOSITORY_SETTINGS'])
+    user_ids = [args.user] if args.user else [user.user for user in db.get_all_users()]
+
+    for user_id in user_ids:
+        changed = db.classify_user_articles(user_id)
+        if changed is not None:
+            print('%s: %d articles moved to user, %d to others' % (user_id, changed['user'], changed['others']))
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(description='ScholarCrawler maintenance commands')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    # Page store commands
+    pages = commands.add_parser('pages', help='Deduplicated page store').add_subparsers(dest='action')
+    pages.required = True
+
+    pages.add_parser('status', help='Number of pages and deduplicated size').set_defaults(function=pages_status)
+
+    find = pages.add_parser('find', help='Find the stored pages')
+    find.add_argument('--user', help='User id')
+    find.add_argument('--crawl', type=int, help='Crawl id (start timestamp in microseconds)')
+    find.add_argument('--page', type=int, help='Results page number')
+    find.add_argument('--since', type=parse_date, help='Downloaded from this date')
+    find.add_argument('--until', type=parse_date, help='Downloaded before this date')
+    find.add_argument('--deleted', action='store_true', help='Include the pruned pages')
+    find.set_defaults(function=pages_find)
+
+    show = pages.add_parser('show', help='Print the content of a page')
+    show.add_argument('digest', help='SHA-256 of the page')
+    show.set_defaults(function=pages_show)
+
+    prune = pages.add_parser('prune', help='Delete the pages older than the retention days')
+    prune.add_argument('--days', type=int, help='Retention days (PAGE_STORE_RETENTION_DAYS by default)')
+    prune.set_defaults(function=pages_prune)
+
+    pages.add_parser('compact', help='Remove the deleted pages from the disk').set_defaults(function=pages_compact)
+
+    # Offline processing of the downloaded pages
+    replay_parser = commands.add_parser('replay', help='Process the downloaded pages again and store the articles')
+    replay_parser.add_argument('paths', nargs='*', help='Archives (.pages.gz), zip files or directories with them')
+    replay_parser.add_argument('--store', action='store_true', help='Replay the pages of the page store')
+    replay_parser.add_argument('--user', help='Only the pages of this user id')
+    replay_parser.add_argument('--since', type=parse_date, help='Only the pages stored from this date (page store)')
+    replay_parser.add_argument('--workers', type=int, help='Worker processes (number of CPUs by default)')
+    replay_parser.add_argument('--batch-size', type=int, default=500, help='Articles per repository write')
+    replay_parser.set_defaults(function=replay)
+
+    # Repository indexes
+    indexes_parser = commands.add_parser('indexes', help='Report the missing and unused repository indexes')
+    indexes_parser.add_argument('--create', action='store_true', help='Create the missing indexes first')
+    indexes_parser.set_defaults(function=indexes)
+
+    # Migration of the per user article collections to the articles collection
+    migrate_parser = commands.add_parser('migrate-articles', help='Copy the articles_<userId> collections into '
+                                                                  'the articles collection')
+    migrate_parser.add_argument('--batch-size', type=int, default=1000, help='Articles per bulk write')
+    migrate_parser.add_argument('--drop', action='store_true', help='Drop the old collections once copied')
+    migrate_parser.set_defaults(function=migrate_articles)
+
+    # Classification of the articles into the user and others groups
+    classify_parser = commands.add_parser('classify-articles', help='Classify the stored articles again with the '
+                                                                    'current user aliases')
+    classify_parser.add_argument('--user', help='Only the articles of this user id')
+    classify_parser.set_defaults(function=classify_articles)
+
+    return parser
+
+
+if __name__ == '__main__':
+    ARGS = create_parser().parse_args()
+    sys.exit(ARGS.function(ARGS))